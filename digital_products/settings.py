@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     "products",
     "users",
     "rest_framework",
@@ -42,6 +44,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "products.middleware.CustomerCartMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -58,6 +61,8 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "products.context_processors.category_tree",
+                "products.context_processors.cart_badge",
             ],
         },
     },
@@ -81,6 +86,49 @@ DATABASES = {
 }
 
 
+# Cache
+
+# Product card fragments are stored in the "template_fragments" alias used by
+# {% cache %}; point FRAGMENT_CACHE_BACKEND at a shared backend in production.
+FRAGMENT_CACHE_BACKEND = os.environ.get(
+    "FRAGMENT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+FRAGMENT_CACHE_LOCATION = os.environ.get(
+    "FRAGMENT_CACHE_LOCATION", "template-fragments"
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "template_fragments": {
+        "BACKEND": FRAGMENT_CACHE_BACKEND,
+        "LOCATION": FRAGMENT_CACHE_LOCATION,
+    },
+}
+
+# Anonymous carts live in the session (products.cart.SessionCart). Use the
+# "cache" or "signed_cookies" engine to keep them off the database.
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "django.contrib.sessions.backends.db")
+
+# How long checkout holds limited stock for a cart (products.stock)
+STOCK_RESERVATION_MINUTES = 15
+
+# Seconds the header's cart count and subtotal are cached for, cart changes
+# made through the site invalidate them straight away
+CART_BADGE_TIMEOUT = 300
+
+# Seconds cached API responses live per resource (products.api_cache); model
+# signals drop them as soon as the data changes
+API_CACHE_TIMEOUTS = {"products": 300, "categories": 3600, "files": 300}
+
+# Rows per INSERT/UPDATE/DELETE of the /bulk/ endpoints (products.bulk)
+BULK_BATCH_SIZE = 500
+
+# Rows fetched per database round trip by the streaming exports (products.export)
+EXPORT_CHUNK_SIZE = 2000
+
+
 # Password validation
 
 
@@ -135,8 +183,27 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # orjson-backed JSON first (the default), see products.renderers
+    "DEFAULT_RENDERER_CLASSES": [
+        "products.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "products.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Accept: application/msgpack when the optional msgpack package is installed
+if find_spec("msgpack"):
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append(
+        "products.renderers.MessagePackRenderer"
+    )
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append(
+        "products.renderers.MessagePackParser"
+    )
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Electro Shop API",
     "DESCRIPTION": "API for Electro Shop - digital products store",
@@ -10,7 +10,13 @@ from .models import (
     Customer,
     Order,
     OrderItem,
+    StockReservation,
+    CategorySalesDaily,
+    ProductSalesDaily,
 )
+from .forms import ProductAdminForm
+from .search import search_products
+from .stock import restock
 
 
 class CartItemInline(admin.TabularInline):
@@ -18,11 +24,27 @@ class CartItemInline(admin.TabularInline):
     extra = 0
 
 
+class ItemTotalsAdminMixin:
+    """List totals summed in the changelist query instead of per row"""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description="items", ordering="item_count")
+    def item_count(self, obj):
+        return obj.item_count
+
+    @admin.display(description="total", ordering="total_price")
+    def total_price(self, obj):
+        return obj.total_price
+
+
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = ["customer", "created_at", "is_active"]
+class CartAdmin(ItemTotalsAdminMixin, admin.ModelAdmin):
+    list_display = ["customer", "created_at", "is_active", "item_count", "total_price"]
     list_filter = ["created_at", "is_active"]
     search_fields = ["customer"]
+    list_select_related = ["customer"]
     inlines = [CartItemInline]
 
 
@@ -37,10 +59,11 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ["customer", "phone"]
+class OrderAdmin(ItemTotalsAdminMixin, admin.ModelAdmin):
+    list_display = ["customer", "phone", "item_count", "total_price"]
     list_filter = ["date"]
     search_fields = ["customer"]
+    list_select_related = ["customer"]
     inlines = [OrderItemInline]
 
 
@@ -55,6 +78,14 @@ class CommentAdmin(admin.ModelAdmin):
 admin.site.register(Contact)
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ["product", "cart", "quantity", "expires_at"]
+    list_filter = ["expires_at"]
+    list_select_related = ["product"]
+    raw_id_fields = ["product", "cart"]
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("id", "title", "parent", "is_enable", "created_at")
@@ -78,11 +109,54 @@ class ProductAdmin(admin.ModelAdmin):
         "is_enable",
         "created_at",
         "is_off",
+        "effective_price",
         "is_new",
         "is_stock",
+        "stock",
     )
     list_filter = ("created_at", "is_off", "is_new", "is_stock")
     search_fields = ("title", "description", "is_off", "is_new", "is_stock")
     filter_horizontal = ("categories",)
     ordering = ("-created_at",)
     inlines = [FileInlineModelAdmin]
+    form = ProductAdminForm
+    readonly_fields = ("stock",)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if form.cleaned_data.get("restock"):
+            restock({obj.pk: form.cleaned_data["restock"]})
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains over search_fields
+        if not search_term.strip():
+            return queryset, False
+        return search_products(queryset, search_term), False
+
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    """Read-only, the rows are maintained by products.sales"""
+
+    list_filter = ["date"]
+    date_hierarchy = "date"
+    ordering = ["-date", "-revenue"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductSalesDaily)
+class ProductSalesDailyAdmin(SalesRollupAdmin):
+    list_display = ["date", "product", "units", "revenue", "orders"]
+    list_select_related = ["product"]
+    search_fields = ["product__title"]
+
+
+@admin.register(CategorySalesDaily)
+class CategorySalesDailyAdmin(SalesRollupAdmin):
+    list_display = ["date", "category", "units", "revenue", "orders"]
+    list_select_related = ["category"]
+    search_fields = ["category__title"]
@@ -0,0 +1,149 @@
+"""
+Read-through cache for the public catalog API.
+
+Rendered ``list``/``retrieve`` responses of the products, categories and
+files endpoints are cached per resource for ``API_CACHE_TIMEOUTS`` seconds,
+keyed on the path, the sorted query parameters and the ``Accept`` header.
+Every key embeds the resource's current *generation*; model signals replace
+the generation (after commit) when a Product, Category or File changes, which
+drops all cached responses of the resources showing that model at once
+without having to find their keys.
+
+Changes made with ``QuerySet.update()`` send no signals: category, rating
+and in-stock changes invalidate explicitly, stock counts alone may lag by up
+to the TTL.
+A hit also answers ``If-None-Match``/``If-Modified-Since`` from the stored
+validators, so revalidating a cached response does not touch the database.
+
+HTML renderings (the browsable API) embed the visitor's CSRF token and
+forms built for them, they are never cached.
+
+Hits and misses are counted per resource in the cache, see
+``api_cache_stats()``. Point ``API_CACHE_ALIAS`` (default: ``default``) at a
+shared backend in production so every process sees the same generations.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+from rest_framework.renderers import BrowsableAPIRenderer, TemplateHTMLRenderer
+
+DEFAULT_TIMEOUTS = {"products": 300, "categories": 3600, "files": 300}
+# Which cached resources show each model's data
+MODEL_RESOURCES = {
+    "Product": ("products", "files"),
+    "Category": ("products", "categories", "files"),
+    "File": ("products", "files"),
+}
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Vary")
+
+
+def api_cache():
+    return caches[getattr(settings, "API_CACHE_ALIAS", "default")]
+
+
+def api_cache_timeout(resource):
+    timeouts = {**DEFAULT_TIMEOUTS, **getattr(settings, "API_CACHE_TIMEOUTS", {})}
+    return timeouts[resource]
+
+
+def _generation(resource):
+    key = f"products:api_cache:{resource}:generation"
+    generation = api_cache().get(key)
+    if generation is None:
+        api_cache().add(key, uuid.uuid4().hex, None)
+        generation = api_cache().get(key)
+    return generation
+
+
+def invalidate_api_cache(*resources):
+    """Drop every cached response of ``resources``"""
+    api_cache().set_many(
+        {f"products:api_cache:{r}:generation": uuid.uuid4().hex for r in resources},
+        None,
+    )
+
+
+def invalidate_for_model(model):
+    invalidate_api_cache(*MODEL_RESOURCES[model.__name__])
+
+
+def is_cacheable_renderer(renderer):
+    """False for renderers whose output depends on the visitor"""
+    return not isinstance(renderer, (BrowsableAPIRenderer, TemplateHTMLRenderer))
+
+
+def response_cache_key(resource, request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    raw = f"{request.path}?{query}|{request.META.get('HTTP_ACCEPT', '')}"
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f"products:api_cache:{resource}:{_generation(resource)}:{digest}"
+
+
+def _count(resource, outcome):
+    key = f"products:api_cache:{resource}:{outcome}"
+    cache = api_cache()
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def get_cached_response(resource, request):
+    """The cached response for ``request`` (or a 304), None on a miss"""
+    cached = api_cache().get(response_cache_key(resource, request))
+    if cached is None:
+        _count(resource, "misses")
+        return None
+    _count(resource, "hits")
+    content, headers = cached
+    response = HttpResponse(content, content_type=headers.pop("Content-Type"))
+    for name, value in headers.items():
+        response[name] = value
+    response["X-Cache"] = "HIT"
+    return get_conditional_response(
+        request,
+        etag=headers.get("ETag"),
+        last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+        response=response,
+    )
+
+
+def cache_response(resource, request, response):
+    """Store a rendered copy of a finalized 200 response"""
+    response.render()
+    headers = {name: response[name] for name in CACHED_HEADERS if name in response}
+    api_cache().set(
+        response_cache_key(resource, request),
+        (response.content, headers),
+        api_cache_timeout(resource),
+    )
+    response["X-Cache"] = "MISS"
+
+
+def api_cache_stats():
+    """``{resource: {"hits", "misses", "hit_ratio", "timeout"}}``"""
+    keys = [
+        f"products:api_cache:{resource}:{outcome}"
+        for resource in DEFAULT_TIMEOUTS
+        for outcome in ("hits", "misses")
+    ]
+    counts = api_cache().get_many(keys)
+    stats = {}
+    for resource in DEFAULT_TIMEOUTS:
+        hits = counts.get(f"products:api_cache:{resource}:hits", 0)
+        misses = counts.get(f"products:api_cache:{resource}:misses", 0)
+        stats[resource] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "timeout": api_cache_timeout(resource),
+        }
+    return stats
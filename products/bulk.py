@@ -0,0 +1,176 @@
+"""
+Bulk writes for catalog sync jobs.
+
+``bulk_create()``, ``bulk_update()`` and ``bulk_delete()`` take a list
+payload and validate every row with the endpoint's serializer (one
+serializer instance for the whole batch, so fields are built once). Valid
+rows are written in ``BULK_BATCH_SIZE`` chunks with ``bulk_create``,
+``bulk_update`` or ``QuerySet.delete()`` inside one transaction. Invalid
+rows are skipped and reported by index, like unknown products in
+``add_to_cart``.
+
+``bulk_create``/``bulk_update`` send no model signals, so the side effects
+the signals in products.signals would have run are done once per batch:
+``updated_at`` bumps (the product card cache key), the search index, the
+category paths and tree, and the API response cache. ``QuerySet.delete()``
+does send them.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .api_cache import invalidate_for_model
+from .category_tree import invalidate_category_tree
+from .fragments import touch_products
+from .models import Category, Product
+from .search import index_products
+
+
+def batch_size():
+    return getattr(settings, "BULK_BATCH_SIZE", 500)
+
+
+def _error(index, errors, pk=None):
+    error = {"index": index, "errors": errors}
+    if pk is not None:
+        error["id"] = pk
+    return error
+
+
+def _pk(model, value):
+    """``value`` as a primary key of ``model``, None if it cannot be one"""
+    try:
+        return model._meta.pk.to_python(value)
+    except (TypeError, ValueError, DjangoValidationError):
+        return None
+
+
+def _validate(serializer, row, instance=None):
+    """``(validated_data, None)`` or ``(None, errors)`` for one row"""
+    if not isinstance(row, dict):
+        return None, {"non_field_errors": ["Expected an object."]}
+    serializer.instance = instance
+    try:
+        return serializer.run_validation(row), None
+    except ValidationError as exc:
+        return None, exc.detail
+
+
+def _after_write(model, created=(), updated=(), changed_fields=()):
+    """Run the side effects ``post_save`` receivers would have run"""
+    if model is Product:
+        index_products([obj.pk for obj in (*created, *updated)])
+    elif model is Category:
+        if created:
+            _set_category_paths(created)
+        if updated and changed_fields & {"title", "is_enable"}:
+            # Category titles are shown on (and indexed with) their products
+            links = Product.categories.through.objects.filter(
+                category__in=[obj.pk for obj in updated]
+            )
+            product_ids = set(links.values_list("product_id", flat=True))
+            index_products(product_ids)
+            touch_products(product_ids)
+        transaction.on_commit(invalidate_category_tree)
+    transaction.on_commit(lambda: invalidate_for_model(model))
+
+
+def _set_category_paths(categories):
+    parent_ids = {obj.parent_id for obj in categories if obj.parent_id}
+    parents = dict(Category.objects.filter(pk__in=parent_ids).values_list("pk", "path"))
+    for obj in categories:
+        obj.path, obj.depth = obj.build_path(parents.get(obj.parent_id, ""))
+    Category.objects.bulk_update(categories, ["path", "depth"], batch_size=batch_size())
+
+
+def bulk_create(serializer_class, rows, context=None):
+    """Create the valid ``rows``, returns ``(created_ids, errors)``"""
+    model = serializer_class.Meta.model
+    serializer = serializer_class(context=context)
+    objs, errors = [], []
+    for index, row in enumerate(rows):
+        data, row_errors = _validate(serializer, row)
+        if row_errors:
+            errors.append(_error(index, row_errors))
+        else:
+            objs.append(model(**data))
+    with transaction.atomic():
+        objs = model.objects.bulk_create(objs, batch_size=batch_size())
+        _after_write(model, created=objs)
+    return [obj.pk for obj in objs], errors
+
+
+def bulk_update(serializer_class, rows, context=None):
+    """
+    Partially update the valid ``rows`` (each with an ``id``), returns
+    ``(updated_ids, errors)``. Rows are grouped by the fields they set, so a
+    row never writes back a column it did not send.
+    """
+    model = serializer_class.Meta.model
+    serializer = serializer_class(context=context, partial=True)
+    pks = [_pk(model, row.get("id")) if isinstance(row, dict) else None for row in rows]
+    instances = model.objects.in_bulk([pk for pk in pks if pk is not None])
+    has_updated_at = any(f.name == "updated_at" for f in model._meta.concrete_fields)
+
+    groups, moved, errors, seen = defaultdict(list), [], [], set()
+    for index, (row, pk) in enumerate(zip(rows, pks)):
+        instance = instances.get(pk)
+        if instance is None or pk in seen:
+            message = "Repeated in this batch." if instance else "No such object."
+            errors.append(_error(index, {"id": [message]}, pk))
+            continue
+        data, row_errors = _validate(serializer, row, instance)
+        if row_errors:
+            errors.append(_error(index, row_errors, pk))
+            continue
+        seen.add(pk)
+        for name, value in data.items():
+            setattr(instance, name, value)
+        if "parent" in data:
+            # Re-rooting a subtree is left to Category.save()
+            moved.append(instance)
+        else:
+            groups[frozenset(data)].append(instance)
+
+    now = timezone.now()
+    updated, changed_fields = [], set()
+    with transaction.atomic():
+        for fields, objs in groups.items():
+            fields = set(fields)
+            if has_updated_at:
+                fields.add("updated_at")
+                for obj in objs:
+                    obj.updated_at = now
+            model.objects.bulk_update(objs, sorted(fields), batch_size=batch_size())
+            updated += objs
+            changed_fields |= fields
+        for obj in moved:
+            obj.save()
+        _after_write(model, updated=updated, changed_fields=changed_fields)
+    return [obj.pk for obj in updated + moved], errors
+
+
+def bulk_delete(model, ids):
+    """Delete the objects with primary keys ``ids``, returns ``(ids, errors)``"""
+    pks = [_pk(model, value) for value in ids]
+    existing = set(
+        model.objects.filter(pk__in=[pk for pk in pks if pk is not None]).values_list(
+            "pk", flat=True
+        )
+    )
+    errors = [
+        _error(index, {"id": ["No such object."]}, value)
+        for index, (value, pk) in enumerate(zip(ids, pks))
+        if pk not in existing
+    ]
+    deleted = sorted(existing)
+    size = batch_size()
+    with transaction.atomic():
+        for start in range(0, len(deleted), size):
+            model.objects.filter(pk__in=deleted[start : start + size]).delete()
+    return deleted, errors
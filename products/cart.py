@@ -0,0 +1,258 @@
+"""
+Shopping carts.
+
+Logged-in users keep their cart in ``Cart``/``CartItem`` rows. Anonymous
+visitors get a ``SessionCart`` holding ``{product_id: quantity}`` in their
+session, so window shopping never writes cart rows; with a cache or
+signed-cookie ``SESSION_ENGINE`` it stays off the database entirely. Both
+backends share one API and ``get_cart(request)`` picks the right one. The
+session cart is folded into the user's ``Cart`` when they log in (see
+``merge_session_cart``).
+
+``add_to_cart()`` adds any number of products to a cart with a fixed number
+of queries: one ``in_bulk`` fetch of the products, one ``INSERT .. ON
+CONFLICT DO NOTHING`` for lines the cart does not have yet, and one UPDATE
+that increments every line's quantity in place. Increments are applied by the
+database (``quantity = quantity + n``) so concurrent adds never lose updates.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+
+from .customers import get_customer, get_customer_id
+from .models import Cart, CartItem, Product
+
+SESSION_CART_KEY = "cart"
+CART_PRODUCT_FIELDS = ("id", "title", "avatar", "effective_price")
+
+
+def parse_cart_lines(product_ids, quantities):
+    """
+    Pair submitted ids with quantities, returns ``(lines, invalid)``.
+
+    ``lines`` maps product id to the total requested quantity (at least 1 per
+    submitted row, repeats are summed) and ``invalid`` lists the raw ids that
+    are not integers.
+    """
+    lines, invalid = {}, []
+    for raw_id, raw_quantity in zip(product_ids, quantities):
+        try:
+            product_id = int(raw_id)
+        except (TypeError, ValueError):
+            invalid.append(raw_id)
+            continue
+        try:
+            quantity = max(int(raw_quantity), 1)
+        except (TypeError, ValueError):
+            quantity = 1
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines, invalid
+
+
+def cart_products(product_ids, fields=("id", "title")):
+    """Enabled products by id, one query"""
+    return Product.objects.enabled().only(*fields).in_bulk(list(product_ids))
+
+
+def add_to_cart(cart, lines):
+    """
+    Add ``{product_id: quantity}`` to ``cart``, returns ``(added, unknown)``.
+
+    ``added`` maps each product that exists and is enabled to its Product and
+    ``unknown`` lists the ids that were skipped, the rest of the batch is
+    still applied.
+    """
+    products = cart_products(lines)
+    unknown = [product_id for product_id in lines if product_id not in products]
+    if not products:
+        return products, unknown
+
+    with transaction.atomic():
+        # Make sure every line exists, then increment all of them at once
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product_id=product_id, quantity=0)
+                for product_id in products
+            ],
+            ignore_conflicts=True,
+        )
+        increment = Case(
+            *[
+                When(product_id=product_id, then=Value(lines[product_id]))
+                for product_id in products
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        CartItem.objects.filter(cart=cart, product_id__in=products).update(
+            quantity=F("quantity") + increment
+        )
+        touch_cart(cart.pk)
+    return products, unknown
+
+
+def touch_cart(cart_id):
+    """Mark the cart as used now, see products.cart_cleanup"""
+    Cart.objects.filter(pk=cart_id).update(updated_at=Now())
+
+
+def get_active_cart(customer_id):
+    cart, _ = Cart.objects.with_totals().get_or_create(
+        customer_id=customer_id, is_active=True
+    )
+    return cart
+
+
+class DatabaseCart:
+    """Cart rows of a logged-in customer"""
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    def add(self, lines):
+        """Add ``{product_id: quantity}``, returns ``(added, unknown)``"""
+        return add_to_cart(self.cart, lines)
+
+    def set_quantity(self, item_id, quantity):
+        """
+        Set a line's quantity, removing it at 0 or below. Returns the line's
+        product, or None if the cart has no such line.
+        """
+        item = (
+            self.cart.items.select_related("product")
+            .only("id", "cart", "product__title")
+            .filter(pk=item_id)
+            .first()
+        )
+        if item is None:
+            return None
+        if quantity <= 0:
+            item.delete()
+        else:
+            CartItem.objects.filter(pk=item.pk).update(quantity=quantity)
+        touch_cart(self.cart.pk)
+        return item.product
+
+    def items(self):
+        return (
+            self.cart.items.with_line_total()
+            .select_related("product")
+            .only(
+                "id",
+                "cart",
+                "quantity",
+                *(f"product__{f}" for f in CART_PRODUCT_FIELDS),
+            )
+            .order_by("id")
+        )
+
+    def lines(self):
+        return dict(self.cart.items.values_list("product_id", "quantity"))
+
+    def get_total_price(self):
+        return self.cart.get_total_price()
+
+    def clear(self):
+        self.cart.items.all().delete()
+        touch_cart(self.cart.pk)
+
+
+class SessionCartItem:
+    """A session cart line, shaped like a CartItem annotated with line_total"""
+
+    def __init__(self, product, quantity):
+        # Lines are addressed by product id, there is no row id
+        self.id = product.pk
+        self.product = product
+        self.quantity = quantity
+        self.line_total = product.effective_price * quantity
+
+    def get_total_price(self):
+        return self.line_total
+
+
+class SessionCart:
+    """Cart of an anonymous visitor, kept in their session"""
+
+    def __init__(self, session):
+        self.session = session
+        self._items = None
+
+    def lines(self):
+        stored = self.session.get(SESSION_CART_KEY, {})
+        return {int(product_id): quantity for product_id, quantity in stored.items()}
+
+    def _save(self, lines):
+        # Session data is JSON, keys have to be strings
+        self.session[SESSION_CART_KEY] = {
+            str(product_id): quantity for product_id, quantity in lines.items()
+        }
+        self._items = None
+
+    def add(self, lines):
+        """Add ``{product_id: quantity}``, returns ``(added, unknown)``"""
+        products = cart_products(lines)
+        unknown = [product_id for product_id in lines if product_id not in products]
+        stored = self.lines()
+        for product_id in products:
+            stored[product_id] = stored.get(product_id, 0) + lines[product_id]
+        if products:
+            self._save(stored)
+        return products, unknown
+
+    def set_quantity(self, item_id, quantity):
+        stored = self.lines()
+        if item_id not in stored:
+            return None
+        products = cart_products([item_id])
+        if quantity <= 0 or item_id not in products:
+            del stored[item_id]
+        else:
+            stored[item_id] = quantity
+        self._save(stored)
+        return products.get(item_id)
+
+    def items(self):
+        if self._items is None:
+            lines = self.lines()
+            products = cart_products(lines, CART_PRODUCT_FIELDS)
+            # Products disabled or deleted since they were added drop out
+            self._items = [
+                SessionCartItem(products[product_id], quantity)
+                for product_id, quantity in lines.items()
+                if product_id in products
+            ]
+        return self._items
+
+    def get_total_price(self):
+        return sum(item.line_total for item in self.items())
+
+    def clear(self):
+        self.session.pop(SESSION_CART_KEY, None)
+        self._items = None
+
+
+def get_cart(request):
+    """
+    The cart backend for this request's visitor. Views use the lazy
+    ``request.cart`` set up by CustomerCartMiddleware instead.
+    """
+    customer_id = get_customer_id(request)
+    if customer_id is not None:
+        return DatabaseCart(get_active_cart(customer_id))
+    return SessionCart(request.session)
+
+
+def merge_session_cart(request, user):
+    """
+    Fold the anonymous session cart into ``user``'s Cart in one bulk add.
+    Returns ``(added, unknown)`` like ``add_to_cart``.
+    """
+    session_cart = SessionCart(request.session)
+    lines = session_cart.lines()
+    if not lines:
+        return {}, []
+    result = add_to_cart(get_active_cart(get_customer(user).pk), lines)
+    session_cart.clear()
+    return result
@@ -0,0 +1,69 @@
+"""
+Cached cart badge for the site header.
+
+Every page shows the visitor's cart item count and subtotal, so they are
+kept in one cache entry per user (or per session for anonymous carts)
+instead of summing ``CartItem`` on every request. The cart mutation views
+and the login merge call ``invalidate_cart_badge()``; anything else that
+changes a cart or a price shows up after ``CART_BADGE_TIMEOUT`` seconds.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cart import SESSION_CART_KEY, SessionCart
+from .customers import get_customer_id
+from .models import Cart
+
+CART_BADGE_CACHE_KEY = "products:cart_badge:{}"
+EMPTY_CART_BADGE = {"count": 0, "subtotal": 0}
+
+
+def cart_badge_timeout():
+    return getattr(settings, "CART_BADGE_TIMEOUT", 300)
+
+
+def cart_badge_key(request, user=None):
+    """Cache key of the visitor's badge, None when they have no cart at all"""
+    user = user or request.user
+    if user.is_authenticated:
+        return CART_BADGE_CACHE_KEY.format(f"user:{user.pk}")
+    session = request.session
+    if session.session_key and SESSION_CART_KEY in session:
+        return CART_BADGE_CACHE_KEY.format(f"session:{session.session_key}")
+    return None
+
+
+def build_cart_badge(request):
+    if not request.user.is_authenticated:
+        items = SessionCart(request.session).items()
+        return {
+            "count": sum(item.quantity for item in items),
+            "subtotal": sum(item.line_total for item in items),
+        }
+    # Reads the open cart without creating one, a single aggregate query
+    totals = (
+        Cart.objects.with_totals()
+        .filter(customer_id=get_customer_id(request), is_active=True)
+        .values("item_count", "total_price")
+        .first()
+    )
+    if totals is None:
+        return EMPTY_CART_BADGE
+    return {"count": totals["item_count"], "subtotal": totals["total_price"]}
+
+
+def get_cart_badge(request):
+    key = cart_badge_key(request)
+    if key is None:
+        return EMPTY_CART_BADGE
+    return cache.get_or_set(
+        key, lambda: build_cart_badge(request), cart_badge_timeout()
+    )
+
+
+def invalidate_cart_badge(request, user=None):
+    """Drop the badge of ``request``'s visitor, or of ``user`` logging in"""
+    key = cart_badge_key(request, user)
+    if key is not None:
+        cache.delete(key)
@@ -0,0 +1,79 @@
+"""
+Purging abandoned and checked-out carts.
+
+``purge_stale_carts()`` walks ``Cart`` by primary-key ranges of
+``batch_size`` and deletes the stale carts of each range (with their lines)
+in its own short transaction, so no lock is held for longer than one small
+batch and the job can be stopped and rerun at any point. Stale means:
+
+* open carts nobody touched for ``active_days`` (``Cart.updated_at``);
+* checked-out carts older than ``inactive_days``, their orders keep a copy of
+  every line.
+
+Stock held for a deleted cart is released by the reservation sweeper, the
+reservation rows outlive the cart.
+"""
+
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+
+def stale_condition(active_days=30, inactive_days=30, now=None):
+    now = now or timezone.now()
+    return Q(is_active=True, updated_at__lt=now - timedelta(days=active_days)) | Q(
+        is_active=False, updated_at__lt=now - timedelta(days=inactive_days)
+    )
+
+
+def purge_stale_carts(
+    active_days=30,
+    inactive_days=30,
+    batch_size=1000,
+    dry_run=False,
+    pause=0,
+    now=None,
+    progress=None,
+):
+    """
+    Delete (or with ``dry_run`` only count) stale carts, returns the totals
+    ``{"carts", "items", "batches", "seconds"}``. ``progress`` is called with
+    the running totals after every batch; ``pause`` seconds are slept between
+    batches to throttle the job on a busy database.
+    """
+    condition = stale_condition(active_days, inactive_days, now)
+    bounds = Cart.objects.aggregate(low=Min("pk"), high=Max("pk"))
+    totals = {"carts": 0, "items": 0, "batches": 0, "seconds": 0.0}
+    if bounds["low"] is None:
+        return totals
+
+    started = time.monotonic()
+    for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+        carts = Cart.objects.filter(condition, pk__gte=start, pk__lt=start + batch_size)
+        with transaction.atomic():
+            if dry_run:
+                items = CartItem.objects.filter(cart__in=carts).count()
+                deleted = carts.count()
+            else:
+                _, per_model = carts.delete()
+                deleted = per_model.get(Cart._meta.label, 0)
+                items = per_model.get(CartItem._meta.label, 0)
+        totals["carts"] += deleted
+        totals["items"] += items
+        totals["batches"] += 1
+        totals["seconds"] = time.monotonic() - started
+        if progress is not None:
+            progress(totals)
+        if pause:
+            time.sleep(pause)
+    return totals
+
+
+def rows_per_second(totals):
+    rows = totals["carts"] + totals["items"]
+    return rows / totals["seconds"] if totals["seconds"] else float(rows)
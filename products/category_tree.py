@@ -0,0 +1,44 @@
+"""
+Cached category tree for the navigation menu.
+
+The whole enabled tree is built from one query ordered by materialized path
+and stored as plain dicts, so pages render the menu without touching the
+database until a category changes.
+"""
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Category
+
+CATEGORY_TREE_CACHE_KEY = "products:category_tree"
+
+
+def build_category_tree():
+    nodes, roots = {}, []
+    categories = Category.objects.enabled().only("id", "title", "parent_id", "path")
+    for category in categories.order_by("path"):
+        node = {
+            "id": category.pk,
+            "title": category.title,
+            "path": category.path,
+            "url": reverse("Category_detail", kwargs={"pk": category.pk}),
+            "children": [],
+        }
+        if category.parent_id is None:
+            roots.append(node)
+        elif category.parent_id in nodes:
+            nodes[category.parent_id]["children"].append(node)
+        else:
+            # Parent is disabled, hide the whole branch
+            continue
+        nodes[category.pk] = node
+    return roots
+
+
+def get_category_tree():
+    return cache.get_or_set(CATEGORY_TREE_CACHE_KEY, build_category_tree, None)
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
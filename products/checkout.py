@@ -0,0 +1,105 @@
+"""
+Turning a cart into an order.
+
+``place_order()`` runs in one transaction with a fixed number of queries
+whatever the cart size:
+
+1. lock the customer's active cart (``SELECT .. FOR UPDATE``), so two
+   submits of the same cart queue up instead of both ordering it;
+2. return the existing order if the idempotency key was already used;
+3. read the lines with their current unit prices in one query;
+4. settle limited stock against the cart's reservations (products.stock);
+5. create the Order and ``bulk_create`` its OrderItems, snapshotting prices;
+6. deactivate the cart and add the order to the sales rollups.
+"""
+
+from django.db import IntegrityError, transaction
+
+from .models import Cart, Order, OrderItem
+from .sales import record_order_sales
+from .stock import consume_reservations
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCart(CheckoutError):
+    pass
+
+
+def find_order(customer_id, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(
+        customer_id=customer_id, idempotency_key=idempotency_key
+    ).first()
+
+
+def place_order(customer_id, address, phone="", idempotency_key=None):
+    """
+    Order the customer's active cart, returns ``(order, created)``.
+
+    Resubmitting with an ``idempotency_key`` that already produced an order
+    returns that order with ``created=False``. Raises EmptyCart when there is
+    nothing to order and OutOfStock when limited stock cannot cover the cart.
+    """
+    with transaction.atomic():
+        cart = (
+            Cart.objects.select_for_update()
+            .filter(customer_id=customer_id, is_active=True)
+            .only("id")
+            .first()
+        )
+        # Checked after taking the lock: a concurrent submit with the same
+        # key has committed its order by the time we get here
+        existing = find_order(customer_id, idempotency_key)
+        if existing is not None:
+            return existing, False
+        if cart is None:
+            raise EmptyCart("There is no open cart to check out.")
+
+        lines = list(
+            cart.items.filter(product__is_enable=True, quantity__gt=0)
+            .order_by("id")
+            .values_list(
+                "product_id", "quantity", "product__effective_price", "product__stock"
+            )
+        )
+        if not lines:
+            raise EmptyCart("Your cart is empty.")
+        # Raises OutOfStock, rolling back everything above
+        consume_reservations(
+            cart,
+            {
+                product_id: quantity
+                for product_id, quantity, _, stock in lines
+                if stock is not None
+            },
+        )
+
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    customer_id=customer_id,
+                    address=address,
+                    phone=phone,
+                    idempotency_key=idempotency_key or None,
+                )
+        except IntegrityError:
+            # Same key, different cart: the other checkout won
+            return find_order(customer_id, idempotency_key), False
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order, product_id=product_id, quantity=quantity, price=price
+                )
+                for product_id, quantity, price, _ in lines
+            ]
+        )
+        Cart.objects.filter(pk=cart.pk).update(is_active=False)
+        record_order_sales(
+            order.date,
+            [(product_id, quantity, price) for product_id, quantity, price, _ in lines],
+        )
+    return order, True
@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart_badge import get_cart_badge
+from .category_tree import get_category_tree
+
+
+def category_tree(request):
+    """Expose the cached category tree, loaded only if a template uses it"""
+    return {"category_tree": SimpleLazyObject(get_category_tree)}
+
+
+def cart_badge(request):
+    """Expose the visitor's cached cart count and subtotal for the header"""
+    return {"cart_badge": SimpleLazyObject(lambda: get_cart_badge(request))}
@@ -0,0 +1,63 @@
+"""
+Customer profiles of users.
+
+Every user gets a ``Customer`` row when the user is created (see
+``products.signals``), so request handling only ever reads it. The id is
+cached on the session next to the user id, which lets cart lookups filter on
+``customer_id`` without loading the Customer at all.
+"""
+
+from .models import Customer
+
+CUSTOMER_SESSION_KEY = "_customer"
+
+
+def customer_defaults(user):
+    """Field values for a new Customer of ``user``"""
+    return {
+        "first_name": getattr(user, "first_name", "FirstName"),
+        "last_name": getattr(user, "last_name", "LastName"),
+        "email": getattr(user, "email", None) or "example@example.com",
+        "phone": (getattr(user, "phone_number", None) or "00000000000")[:11],
+    }
+
+
+def get_customer(user):
+    """The Customer profile of ``user``, created if it is missing"""
+    customer, _ = Customer.objects.get_or_create(
+        user=user, defaults=customer_defaults(user)
+    )
+    return customer
+
+
+def get_customer_id(request):
+    """
+    Customer id of the logged-in user, None for anonymous visitors. Resolved
+    through the session, a database hit only the first time per session.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    cached = request.session.get(CUSTOMER_SESSION_KEY)
+    if cached and cached[0] == user.pk:
+        return cached[1]
+    customer_id = (
+        Customer.objects.filter(user=user).values_list("pk", flat=True).first()
+    )
+    if customer_id is None:
+        customer_id = get_customer(user).pk
+    request.session[CUSTOMER_SESSION_KEY] = [user.pk, customer_id]
+    return customer_id
+
+
+def get_request_customer(request):
+    """The logged-in user's Customer, None for anonymous visitors"""
+    customer_id = get_customer_id(request)
+    if customer_id is None:
+        return None
+    customer = Customer.objects.filter(pk=customer_id).first()
+    if customer is None:
+        # The cached profile was deleted, start over
+        request.session.pop(CUSTOMER_SESSION_KEY, None)
+        customer = get_customer(request.user)
+    return customer
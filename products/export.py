@@ -0,0 +1,178 @@
+"""
+Streaming exports of the catalog, orders and comments.
+
+An export reads its table with ``values_list(...).iterator(chunk_size=...)``
+(a server-side cursor on PostgreSQL) and formats it into NDJSON or CSV text
+one chunk of rows at a time, so memory use depends on ``EXPORT_CHUNK_SIZE``,
+not on the size of the table. The generators feed a
+``StreamingHttpResponse`` (``/api/export/<name>.<format>``) or a file
+(``manage.py export_data``).
+
+Product categories are a many-to-many relation, they are read with one
+extra query per chunk and exported as the ``|``-separated category titles.
+"""
+
+import csv
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from .models import Comment, Order, Product
+
+
+def export_chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+class Export:
+    """
+    ``columns`` are ``(header, lookup)`` pairs read with ``values_list()``,
+    ``extend(rows)`` may add columns to a chunk of row dicts.
+    """
+
+    def __init__(self, queryset, columns, extend=None, extra_columns=()):
+        self.queryset = queryset
+        self.columns = columns
+        self.extend = extend
+        self.header = [header for header, _ in columns] + list(extra_columns)
+
+    def rows(self, chunk_size=None):
+        """Row dicts, in chunks (lists) of ``chunk_size``"""
+        chunk_size = chunk_size or export_chunk_size()
+        lookups = [lookup for _, lookup in self.columns]
+        headers = [header for header, _ in self.columns]
+        values = self.queryset.values_list(*lookups).iterator(chunk_size=chunk_size)
+        while chunk := list(islice(values, chunk_size)):
+            chunk = [dict(zip(headers, row)) for row in chunk]
+            if self.extend:
+                self.extend(chunk)
+            yield chunk
+
+
+def _add_categories(rows):
+    titles = defaultdict(list)
+    links = (
+        Product.categories.through.objects.filter(
+            product_id__in=[row["id"] for row in rows]
+        )
+        .order_by("category__title")
+        .values_list("product_id", "category__title")
+    )
+    for product_id, title in links:
+        titles[product_id].append(title)
+    for row in rows:
+        row["categories"] = "|".join(titles[row["id"]])
+
+
+EXPORTS = {
+    "products": Export(
+        Product.objects.order_by("pk"),
+        [
+            (name, name)
+            for name in (
+                "id",
+                "title",
+                "description",
+                "price",
+                "sale_price",
+                "discount_percent",
+                "effective_price",
+                "is_off",
+                "stock",
+                "is_stock",
+                "is_new",
+                "is_enable",
+                "rating_avg",
+                "rating_count",
+                "created_at",
+                "updated_at",
+            )
+        ],
+        extend=_add_categories,
+        extra_columns=["categories"],
+    ),
+    "orders": Export(
+        Order.objects.with_totals().order_by("pk"),
+        [
+            ("id", "id"),
+            ("customer_id", "customer_id"),
+            ("customer_email", "customer__email"),
+            ("date", "date"),
+            ("status", "status"),
+            ("shipped_date", "shipped_date"),
+            ("address", "address"),
+            ("phone", "phone"),
+            ("item_count", "item_count"),
+            ("total_price", "total_price"),
+        ],
+    ),
+    "comments": Export(
+        Comment.objects.order_by("pk"),
+        [
+            ("id", "id"),
+            ("product_id", "product_id"),
+            ("product_title", "product__title"),
+            ("customer_id", "customer_id"),
+            ("stars", "stars"),
+            ("is_approved", "is_approved"),
+            ("created_at", "created_at"),
+            ("text", "text"),
+        ],
+    ),
+}
+
+
+class _Echo:
+    """File-like object handing back what ``csv.writer`` writes"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(header, chunks):
+    """One JSON object per line, one string per chunk"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for rows in chunks:
+        yield "".join(encoder.encode(row) + "\n" for row in rows)
+
+
+def csv_lines(header, chunks):
+    """A header line, then one string per chunk"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for rows in chunks:
+        yield "".join(
+            writer.writerow([row.get(name) for name in header]) for row in rows
+        )
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+    lines = staticmethod(ndjson_lines)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Export streams bypass render(), this formats anything else (errors)
+        rows = data if isinstance(data, list) else [data]
+        header = list(rows[0]) if rows else []
+        return "".join(self.lines(header, [rows])).encode(self.charset)
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    lines = staticmethod(csv_lines)
+
+
+EXPORT_RENDERERS = [NDJSONRenderer, CSVRenderer]
+
+
+def export_lines(name, format, chunk_size=None):
+    """Text chunks of export ``name`` in ``format`` (``ndjson``/``csv``)"""
+    export = EXPORTS[name]
+    renderer = next(r for r in EXPORT_RENDERERS if r.format == format)
+    return renderer.lines(export.header, export.rows(chunk_size))
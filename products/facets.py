@@ -0,0 +1,70 @@
+"""
+Facet counts for the store page and the product API.
+
+All counts come from a single aggregate query over the filtered catalog:
+boolean flags and price bounds are plain conditional aggregates, category
+counts use one ``EXISTS`` per top-level category from the cached category
+tree, so a product in several subcategories is only counted once.
+
+Counting is disjunctive: every facet is counted over the catalog with all
+filters but its own applied, so picking one category still shows how many
+products each other category would add to the selection.
+"""
+
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+
+from .category_tree import get_category_tree
+from .models import Product
+
+FLAG_FACETS = ("is_off", "is_new", "is_stock")
+
+
+def facet_counts(queryset, filters=None, selected_categories=()):
+    """
+    Counts over ``queryset`` narrowed by ``filters`` (``{facet: Q}``, see
+    ``ProductFilterForm.filter_conditions()``), flagging the
+    ``selected_categories`` ids
+    """
+    filters = filters or {}
+
+    def without(facet):
+        condition = Q()
+        for name, q in filters.items():
+            if name != facet:
+                condition &= q
+        return condition
+
+    roots = get_category_tree()
+    aggregates = {
+        "total": Count("pk", filter=without(None)),
+        "min_price": Min("effective_price", filter=without("price")),
+        "max_price": Max("effective_price", filter=without("price")),
+    }
+    for flag in FLAG_FACETS:
+        aggregates[f"flag_{flag}"] = Count(
+            "pk", filter=Q(**{flag: True}) & without(flag)
+        )
+    links = Product.categories.through.objects.filter(product_id=OuterRef("pk"))
+    others = without("category")
+    for node in roots:
+        in_subtree = links.filter(category__path__startswith=node["path"])
+        aggregates[f"category_{node['id']}"] = Count(
+            "pk", filter=Q(Exists(in_subtree)) & others
+        )
+
+    # Ordering and prefetches are irrelevant to the aggregate
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        "total": counts["total"],
+        "price": {"min": counts["min_price"], "max": counts["max_price"]},
+        "flags": {flag: counts[f"flag_{flag}"] for flag in FLAG_FACETS},
+        "categories": [
+            {
+                "id": node["id"],
+                "title": node["title"],
+                "count": counts[f"category_{node['id']}"],
+                "selected": node["id"] in selected_categories,
+            }
+            for node in roots
+        ],
+    }
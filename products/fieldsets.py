@@ -0,0 +1,153 @@
+"""
+Sparse fieldsets and expansion for the API.
+
+``?fields=id,title,price`` trims every object to the listed serializer
+fields and ``?expand=categories`` replaces a relation's ids (or names) by
+nested objects. Serializers opt in with ``SparseFieldsSerializerMixin`` and
+list what can be nested in ``expandable_fields``; views use
+``products.views.SparseFieldsMixin``, which validates the parameters and
+narrows the queryset with ``narrow_queryset()``: ``.only()`` the columns
+behind the selected fields, and join or prefetch just the relations they
+read. A selection that drops ``categories`` costs one query less, not only
+fewer bytes.
+"""
+
+import sys
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+class Expand:
+    """
+    A relation ``?expand=`` can nest. ``serializer`` is a serializer class or
+    the name of one in the declaring serializer's module (for classes defined
+    further down), ``prefetch`` holds extra lookups the nested serializer
+    reads, prefixed with the relation name.
+    """
+
+    def __init__(self, serializer, many=False, prefetch=()):
+        self.serializer = serializer
+        self.many = many
+        self.prefetch = list(prefetch)
+
+    def field(self, owner):
+        serializer = self.serializer
+        if isinstance(serializer, str):
+            serializer = getattr(sys.modules[owner.__module__], serializer)
+        return serializer(many=self.many, read_only=True)
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Prune to ``context["fields"]`` and nest ``context["expand"]``.
+
+    Only the serializer the view creates is affected, nested serializers are
+    built without a context and keep all of their fields. ``field_columns``
+    names the columns behind fields that are not model fields (methods,
+    annotations); fields missing from it and from the model disable the
+    ``.only()`` narrowing.
+    """
+
+    expandable_fields = {}
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        context = kwargs.get("context") or {}
+        expand = context.get(EXPAND_PARAM) or ()
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name].field(type(self))
+        selected = context.get(FIELDS_PARAM)
+        if selected:
+            keep = set(selected) | set(expand)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+
+def _split(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def parse_field_selection(serializer_class, query_params):
+    """
+    ``(fields, expand)`` requested in ``query_params``, ``fields`` is None
+    when all fields are wanted. Raises ValidationError on unknown names.
+    """
+    fields = _split(query_params.get(FIELDS_PARAM, "")) or None
+    expand = _split(query_params.get(EXPAND_PARAM, ""))
+    errors = {}
+    unknown = sorted(set(fields or ()) - set(serializer_class().fields))
+    if unknown:
+        errors[FIELDS_PARAM] = [f"Unknown field(s): {', '.join(unknown)}"]
+    expandable = getattr(serializer_class, "expandable_fields", {})
+    unknown = sorted(set(expand) - set(expandable))
+    if unknown:
+        errors[EXPAND_PARAM] = [f"Cannot expand: {', '.join(unknown)}"]
+    if errors:
+        raise ValidationError(errors)
+    return fields, expand
+
+
+def _lookup_root(lookup):
+    path = getattr(lookup, "prefetch_to", lookup)
+    return path.split("__")[0]
+
+
+def narrow_queryset(queryset, serializer_class, fields, expand, keep=()):
+    """
+    Load only what ``serializer_class`` reads for the ``fields``/``expand``
+    selection. ``keep`` lists more columns to load, e.g. pagination keys.
+    """
+    opts = queryset.model._meta
+    serializer = serializer_class(context={FIELDS_PARAM: fields, EXPAND_PARAM: expand})
+    columns, joined, prefetched, extra = {opts.pk.name}, set(), set(), []
+    for name in keep:
+        try:
+            columns.add(opts.get_field(name).name)
+        except FieldDoesNotExist:
+            pass  # an annotation, e.g. a search rank
+    narrow = True
+    for name, field in serializer.fields.items():
+        if name in serializer_class.field_columns:
+            columns.update(serializer_class.field_columns[name])
+            continue
+        try:
+            model_field = opts.get_field(field.source_attrs[0])
+        except (FieldDoesNotExist, IndexError):
+            # A method or source="*": no telling what it reads
+            narrow = False
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetched.add(model_field.name)
+        elif model_field.is_relation and (
+            name in expand or len(field.source_attrs) > 1
+        ):
+            joined.add(model_field.name)
+            columns.add(model_field.name)
+        else:
+            columns.add(model_field.name)
+        if name in expand:
+            extra.extend(serializer_class.expandable_fields[name].prefetch)
+
+    # Expanded relations are prefetched in full instead of the queryset's
+    # own (narrower) prefetch. Without narrowing everything else is kept.
+    lookups = [
+        lookup
+        for lookup in queryset._prefetch_related_lookups
+        if _lookup_root(lookup) not in expand
+        and (not narrow or _lookup_root(lookup) in prefetched)
+    ]
+    roots = {_lookup_root(lookup) for lookup in lookups}
+    lookups += [name for name in prefetched if name not in roots]
+    queryset = queryset.prefetch_related(None).prefetch_related(*lookups, *extra)
+    if not narrow:
+        return queryset.select_related(*joined) if joined else queryset
+    queryset = queryset.select_related(None)
+    if joined:
+        queryset = queryset.select_related(*joined)
+    return queryset.only(*columns)
@@ -1,5 +1,21 @@
 from django import forms
-from .models import Comment
+from django.db.models import Q
+
+from .models import Category, Comment, Product
+
+
+class ProductAdminForm(forms.ModelForm):
+    """Product change form, stock is added through products.stock.restock()"""
+
+    restock = forms.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Units to add to the stock (starts a count for unlimited products).",
+    )
+
+    class Meta:
+        model = Product
+        fields = "__all__"
 
 
 class CheckoutForm(forms.Form):
@@ -29,6 +45,17 @@ class CheckoutForm(forms.Form):
         required=False,
         widget=forms.Textarea(attrs={"class": "form-control", "rows": 3}),
     )
+    # Rendered once per checkout page, makes resubmits idempotent
+    checkout_key = forms.CharField(
+        required=False, max_length=64, widget=forms.HiddenInput
+    )
+
+    def get_address(self):
+        data = self.cleaned_data
+        if data.get("ship_to_different") and data.get("shipping_address"):
+            return data["shipping_address"]
+        parts = ("address", "city", "country", "zip_code")
+        return ", ".join(data[part] for part in parts if data.get(part))
 
 
 class CommentForm(forms.ModelForm):
@@ -40,3 +67,85 @@ class CommentForm(forms.ModelForm):
 class LoginForm(forms.Form):
     email = forms.EmailField(required=True)
     password = forms.CharField(max_length=50, required=True)
+
+
+class ProductFilterForm(forms.Form):
+    """Store page / product API facet filters and sort, every field optional"""
+
+    # Keyset orderings, each backed by an index and ending in a unique column
+    SORT_ORDERINGS = {
+        "price": ("effective_price", "id"),
+        "-price": ("-effective_price", "-id"),
+    }
+
+    min_price = forms.IntegerField(required=False, min_value=0)
+    max_price = forms.IntegerField(required=False, min_value=0)
+    is_off = forms.BooleanField(required=False)
+    is_new = forms.BooleanField(required=False)
+    is_stock = forms.BooleanField(required=False)
+    category = forms.ModelMultipleChoiceField(
+        queryset=Category.objects.enabled().only("id", "path"), required=False
+    )
+    sort = forms.ChoiceField(
+        required=False,
+        choices=[
+            ("", "Newest"),
+            ("price", "Price: low to high"),
+            ("-price", "Price: high to low"),
+        ],
+    )
+
+    def get_ordering(self):
+        """Keyset ordering for the requested sort, None for the default"""
+        data = self.cleaned_data if self.is_bound else {}
+        return self.SORT_ORDERINGS.get(data.get("sort"))
+
+    def filter_conditions(self):
+        """
+        ``{facet: Q}`` of the valid filters, ignoring any field that failed
+        to clean; facets are ``price``, the flags and ``category``
+        """
+        data = self.cleaned_data if self.is_bound else {}
+        conditions = {}
+        price = Q()
+        if data.get("min_price") is not None:
+            price &= Q(effective_price__gte=data["min_price"])
+        if data.get("max_price") is not None:
+            price &= Q(effective_price__lte=data["max_price"])
+        if price:
+            conditions["price"] = price
+        for flag in ("is_off", "is_new", "is_stock"):
+            if data.get(flag):
+                conditions[flag] = Q(**{flag: True})
+        if data.get("category"):
+            # Any selected category, including its subcategories
+            subtrees = Q()
+            for category in data["category"]:
+                subtrees |= Q(category__path__startswith=category.path)
+            links = Product.categories.through.objects.filter(subtrees)
+            conditions["category"] = Q(pk__in=links.values("product_id"))
+        return conditions
+
+    def filter_queryset(self, queryset):
+        """Apply the valid filters"""
+        return queryset.filter(*self.filter_conditions().values())
+
+
+class SalesFilterForm(forms.Form):
+    """Date range for the sales rollup API, both ends inclusive"""
+
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    product = forms.IntegerField(required=False, min_value=1)
+    category = forms.IntegerField(required=False, min_value=1)
+
+    def filter_queryset(self, queryset):
+        data = self.cleaned_data
+        if data.get("start"):
+            queryset = queryset.filter(date__gte=data["start"])
+        if data.get("end"):
+            queryset = queryset.filter(date__lte=data["end"])
+        for key in ("product", "category"):
+            if data.get(key) and hasattr(queryset.model, key):
+                queryset = queryset.filter(**{f"{key}_id": data[key]})
+        return queryset
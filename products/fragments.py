@@ -0,0 +1,50 @@
+"""
+Product card fragment cache.
+
+Cards in index.html and store.html are wrapped in ``{% cache %}`` keyed on
+``(product.pk, product.updated_at)``, so saving a product is enough to
+invalidate its cards. Changes that alter a card without saving the product
+(category renames, category membership, ratings) go through
+``touch_products``, which drops the stale fragments and bumps ``updated_at``.
+"""
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils import timezone
+
+from .models import Product
+
+PRODUCT_CARD_FRAGMENTS = ("product_card", "product_card_home")
+
+
+def fragment_cache():
+    try:
+        return caches["template_fragments"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def card_keys(pk, updated_at):
+    return [
+        make_template_fragment_key(name, [pk, updated_at])
+        for name in PRODUCT_CARD_FRAGMENTS
+    ]
+
+
+def delete_product_cards(products):
+    """Drop cached cards for ``(pk, updated_at)`` pairs"""
+    keys = []
+    for pk, updated_at in products:
+        keys.extend(card_keys(pk, updated_at))
+    if keys:
+        fragment_cache().delete_many(keys)
+
+
+def touch_products(product_ids):
+    """Invalidate the cards of ``product_ids`` and mark them as modified"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = Product.objects.filter(pk__in=product_ids)
+    delete_product_cards(products.values_list("pk", "updated_at"))
+    products.update(updated_at=timezone.now())
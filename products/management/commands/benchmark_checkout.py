@@ -0,0 +1,57 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from products.checkout import place_order
+from products.customers import get_customer
+from products.models import Cart, CartItem, Product
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Time place_order() on carts of different sizes. Works on throwaway "
+        "rows inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1, 10, 100], metavar="N"
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes, repeat = options["sizes"], options["repeat"]
+        with transaction.atomic():
+            tag = uuid.uuid4().hex[:8]
+            user = CustomUser.objects.create_user(
+                f"bench-{tag}@example.com", f"9{tag[:7]}".ljust(10, "0")
+            )
+            customer = get_customer(user)
+            products = Product.objects.bulk_create(
+                Product(title=f"Benchmark {i}", price=100 + i)
+                for i in range(max(sizes))
+            )
+            self.stdout.write(f"{'items':>6} {'queries':>8} {'median ms':>10}")
+            for size in sizes:
+                timings, queries = [], set()
+                for _ in range(repeat):
+                    cart = Cart.objects.create(customer=customer)
+                    CartItem.objects.bulk_create(
+                        CartItem(cart=cart, product=product, quantity=2)
+                        for product in products[:size]
+                    )
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        place_order(customer.pk, "Benchmark street")
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries.add(len(ctx.captured_queries))
+                self.stdout.write(
+                    f"{size:>6} {'/'.join(map(str, sorted(queries))):>8} "
+                    f"{statistics.median(timings):>10.2f}"
+                )
+            transaction.set_rollback(True)
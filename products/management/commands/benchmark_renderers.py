@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from products.models import Category, Product
+from products.renderers import FastJSONRenderer, MessagePackRenderer, msgpack, orjson
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare render time and payload size of the API renderers on a "
+        "product list. Works on throwaway rows inside a transaction that is "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        renderers = [("json", JSONRenderer())]
+        if orjson is not None:
+            renderers.append(("orjson", FastJSONRenderer()))
+        if msgpack is not None:
+            renderers.append(("msgpack", MessagePackRenderer()))
+
+        with transaction.atomic():
+            category = Category.objects.create(title="Benchmark")
+            products = Product.objects.bulk_create(
+                Product(
+                    title=f"Benchmark {i}",
+                    description="Benchmark product " * 10,
+                    price=100 + i,
+                    avatar="files/avatar/product.png",
+                )
+                for i in range(options["products"])
+            )
+            category.product_set.add(*products)
+            queryset = Product.objects.catalog().filter(pk__in=[p.pk for p in products])
+            started = time.perf_counter()
+            data = ProductSerializer(queryset, many=True).data
+            self.stdout.write(
+                f"Serialized {len(data)} products in "
+                f"{(time.perf_counter() - started) * 1000:.2f} ms"
+            )
+
+            self.stdout.write(f"{'renderer':>8} {'bytes':>9} {'median ms':>10}")
+            for name, renderer in renderers:
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    content = renderer.render(data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{name:>8} {len(content):>9} {statistics.median(timings):>10.2f}"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from products.export import EXPORT_RENDERERS, EXPORTS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream products, orders or comments to NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument(
+            "--format",
+            choices=[renderer.format for renderer in EXPORT_RENDERERS],
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--output", "-o", help="File to write, standard output by default"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, help="Rows read per database round trip"
+        )
+
+    def handle(self, *args, **options):
+        lines = export_lines(options["name"], options["format"], options["chunk_size"])
+        if not options["output"]:
+            for chunk in lines:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            output.writelines(lines)
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {options['name']} to {options['output']}")
+        )
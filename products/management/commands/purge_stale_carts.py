@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from products.cart_cleanup import purge_stale_carts, rows_per_second
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete abandoned and checked-out carts in primary-key batches, each in "
+        "its own short transaction. Safe to run from a scheduler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--active-days",
+            type=int,
+            default=30,
+            help="Open carts untouched for this many days are abandoned",
+        )
+        parser.add_argument(
+            "--inactive-days",
+            type=int,
+            default=30,
+            help="Checked-out carts are kept this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Seconds to sleep between batches"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count what would be deleted"
+        )
+
+    def handle(self, *args, **options):
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+
+        def progress(totals):
+            if options["verbosity"] > 1:
+                self.stdout.write(self.summary(verb, totals))
+
+        totals = purge_stale_carts(
+            active_days=options["active_days"],
+            inactive_days=options["inactive_days"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            pause=options["pause"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(self.summary(verb, totals)))
+
+    def summary(self, verb, totals):
+        return (
+            f"{verb} {totals['carts']} carts and {totals['items']} items in "
+            f"{totals['batches']} batches, {totals['seconds']:.2f}s, "
+            f"{rows_per_second(totals):.0f} rows/s"
+        )
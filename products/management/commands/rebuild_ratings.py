@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild denormalized product ratings from approved comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "product_ids", nargs="*", type=int, help="Only rebuild these products"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        touched = rebuild_ratings(
+            product_ids=options["product_ids"] or None,
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {touched} products"))
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from products.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily product and category sales rollups from orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", type=date.fromisoformat, help="First day (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--end", type=date.fromisoformat, help="Last day (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="Days rebuilt per transaction",
+        )
+
+    def handle(self, *args, **options):
+        def progress(first, last, written):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{first}..{last}: {written} rows so far")
+
+        written = rebuild_sales(
+            start=options["start"],
+            end=options["end"],
+            chunk_days=options["chunk_days"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} sales rollup rows"))
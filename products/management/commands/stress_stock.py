@@ -0,0 +1,93 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from products.models import Product
+from products.stock import OutOfStock, take_stock
+
+
+def hammer(product_id, threads, attempts, quantity):
+    """
+    Buy ``quantity`` units of one product ``attempts`` times from each of
+    ``threads`` threads at once, returns the tallies and per-attempt latencies.
+    """
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+    tally = {"sold": 0, "rejected": 0, "errors": 0, "latencies": []}
+
+    def buyer():
+        sold = rejected = errors = 0
+        latencies = []
+        try:
+            start.wait()
+            for _ in range(attempts):
+                started = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        take_stock({product_id: quantity})
+                    sold += quantity
+                except OutOfStock:
+                    rejected += 1
+                except DatabaseError:
+                    # e.g. SQLite "database is locked"; counted, never retried
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+        with lock:
+            tally["sold"] += sold
+            tally["rejected"] += rejected
+            tally["errors"] += errors
+            tally["latencies"] += latencies
+
+    workers = [threading.Thread(target=buyer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return tally
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency harness: many threads buy one hot product at once. Fails "
+        "if more units are sold than were in stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=50)
+        parser.add_argument("--stock", type=int, default=200)
+        parser.add_argument("--quantity", type=int, default=1)
+
+    def handle(self, *args, **options):
+        initial = options["stock"]
+        product = Product.objects.create(
+            title="Stock stress test", price=1, stock=initial, is_enable=False
+        )
+        try:
+            started = time.perf_counter()
+            tally = hammer(
+                product.pk, options["threads"], options["attempts"], options["quantity"]
+            )
+            elapsed = time.perf_counter() - started
+            left = Product.objects.values_list("stock", flat=True).get(pk=product.pk)
+        finally:
+            product.delete()
+
+        latencies = sorted(tally["latencies"])
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        consistent = tally["sold"] <= initial and left == initial - tally["sold"]
+        self.stdout.write(
+            f"sold {tally['sold']}/{initial}, rejected {tally['rejected']}, "
+            f"errors {tally['errors']}, left {left}, "
+            f"{'consistent' if consistent else 'OVERSOLD'}\n"
+            f"{len(latencies)} attempts in {elapsed:.2f}s, latency ms "
+            f"p50 {statistics.median(latencies):.2f} p99 {p99:.2f} "
+            f"max {latencies[-1]:.2f}"
+        )
+        if not consistent:
+            raise CommandError("Stock was oversold")
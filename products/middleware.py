@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart
+from .customers import get_request_customer
+
+
+class CustomerCartMiddleware:
+    """
+    Resolve ``request.customer`` and ``request.cart`` lazily, at most once
+    per request. Must come after SessionMiddleware and
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_request_customer(request))
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        return self.get_response(request)
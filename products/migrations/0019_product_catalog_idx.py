@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0018_customer_user_alter_order_date"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_enable", "created_at", "id"], name="product_catalog_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_ratings(apps, schema_editor):
+    Comment = apps.get_model("products", "Comment")
+    Product = apps.get_model("products", "Product")
+    histograms = {}
+    rows = (
+        Comment.objects.filter(is_approved=True)
+        .values("product_id", "stars")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for row in rows:
+        histogram = histograms.setdefault(row["product_id"], [0] * 5)
+        histogram[min(max(row["stars"] or 0, 1), 5) - 1] += row["n"]
+    for product_id, histogram in histograms.items():
+        count = sum(histogram)
+        Product.objects.filter(pk=product_id).update(
+            rating_count=count,
+            rating_avg=sum((s + 1) * n for s, n in enumerate(histogram)) / count,
+            **{f"rating_{s + 1}": n for s, n in enumerate(histogram)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0019_product_catalog_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="1 star ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="2 star ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="3 star ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="4 star ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="5 star ratings"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.FloatField(
+                default=0, editable=False, verbose_name="rating average"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="rating count"
+            ),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    children = {}
+    for pk, parent_id in Category.objects.values_list("id", "parent_id"):
+        children.setdefault(parent_id, []).append(pk)
+    level, depth, batch = [(pk, "") for pk in children.get(None, [])], 0, []
+    while level:
+        next_level = []
+        for pk, prefix in level:
+            path = f"{prefix}{pk:010d}/"
+            batch.append(Category(pk=pk, path=path, depth=depth))
+            next_level.extend((child, path) for child in children.get(pk, []))
+        level, depth = next_level, depth + 1
+    Category.objects.bulk_update(batch, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0020_product_ratings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="depth"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                verbose_name="path",
+            ),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
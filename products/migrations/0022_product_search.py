@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:17
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = """
+CREATE INDEX product_search_idx ON products_product USING gin (search_vector);
+UPDATE products_product p SET search_vector =
+    setweight(to_tsvector('english', coalesce(p.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(p.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(c.title, ' ')
+        FROM products_product_categories pc
+        JOIN products_category c ON c.id = pc.category_id
+        WHERE pc.product_id = p.id
+    ), '')), 'C');
+"""
+POSTGRES_REVERSE = "DROP INDEX IF EXISTS product_search_idx;"
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts "
+    "USING fts5(title, description, categories, tokenize='unicode61')",
+    """
+    INSERT INTO products_product_fts (rowid, title, description, categories)
+    SELECT p.id, p.title, p.description, COALESCE((
+        SELECT group_concat(c.title, ' ')
+        FROM products_product_categories pc
+        JOIN products_category c ON c.id = pc.category_id
+        WHERE pc.product_id = p.id
+    ), '')
+    FROM products_product p
+    """,
+]
+SQLITE_REVERSE = ["DROP TABLE IF EXISTS products_product_fts"]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == "postgresql":
+            schema_editor.execute(postgres)
+        elif vendor == "sqlite":
+            for statement in sqlite:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0021_category_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:21
+
+import re
+
+import django.core.validators
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+def convert_off_price(apps, schema_editor):
+    """Turn the free-form off_price strings into sale_price/discount_percent"""
+    Product = apps.get_model("products", "Product")
+    products = (
+        Product.objects.exclude(off_price__isnull=True)
+        .exclude(off_price="")
+        .only("id", "price", "off_price")
+    )
+    batch = []
+    for product in products.iterator(chunk_size=500):
+        raw = product.off_price.strip()
+        digits = re.sub(r"[^\d.]", "", raw)
+        try:
+            value = round(float(digits))
+        except ValueError:
+            continue
+        if "%" in raw:
+            if 1 <= value <= 99:
+                product.discount_percent = value
+        elif 0 <= value < product.price:
+            product.sale_price = value
+        elif value > product.price:
+            # Some templates showed off_price as the pre-discount price
+            product.sale_price, product.price = product.price, value
+        else:
+            continue
+        batch.append(product)
+    Product.objects.bulk_update(
+        batch, ["price", "sale_price", "discount_percent"], batch_size=500
+    )
+
+
+def restore_off_price(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    batch = []
+    products = Product.objects.exclude(
+        sale_price__isnull=True, discount_percent__isnull=True
+    )
+    for product in products.iterator(chunk_size=500):
+        if product.sale_price is not None:
+            product.off_price = str(product.sale_price)
+        else:
+            product.off_price = f"{product.discount_percent}%"
+        batch.append(product)
+    Product.objects.bulk_update(batch, ["off_price"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0022_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="discount_percent",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                null=True,
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(99),
+                ],
+                verbose_name="discount percent",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="sale_price",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="sale price"
+            ),
+        ),
+        migrations.RunPython(convert_off_price, restore_off_price),
+        migrations.RemoveField(
+            model_name="product",
+            name="off_price",
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        is_off=True,
+                        sale_price__isnull=False,
+                        then=models.F("sale_price"),
+                    ),
+                    models.When(
+                        discount_percent__isnull=False,
+                        is_off=True,
+                        then=django.db.models.expressions.CombinedExpression(
+                            django.db.models.expressions.CombinedExpression(
+                                models.F("price"),
+                                "*",
+                                django.db.models.expressions.CombinedExpression(
+                                    models.Value(100), "-", models.F("discount_percent")
+                                ),
+                            ),
+                            "/",
+                            models.Value(100),
+                        ),
+                    ),
+                    default=models.F("price"),
+                ),
+                output_field=models.IntegerField(),
+                verbose_name="effective price",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_enable", "effective_price", "id"], name="product_price_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:24
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def remove_duplicates(apps, schema_editor):
+    """Collapse rows that the new unique constraints would reject"""
+    Cart = apps.get_model("products", "Cart")
+    CartItem = apps.get_model("products", "CartItem")
+    Comment = apps.get_model("products", "Comment")
+
+    # Keep the newest active cart of each customer open
+    customers = (
+        Cart.objects.filter(is_active=True)
+        .values("customer_id")
+        .annotate(n=Count("id"), keep=Max("id"))
+        .filter(n__gt=1)
+    )
+    for row in customers.order_by():
+        Cart.objects.filter(customer_id=row["customer_id"], is_active=True).exclude(
+            pk=row["keep"]
+        ).update(is_active=False)
+
+    # Merge repeated cart lines into the oldest one
+    lines = (
+        CartItem.objects.values("cart_id", "product_id")
+        .annotate(n=Count("id"), keep=Min("id"), quantity=Sum("quantity"))
+        .filter(n__gt=1)
+    )
+    for row in lines.order_by():
+        CartItem.objects.filter(pk=row["keep"]).update(quantity=row["quantity"])
+        CartItem.objects.filter(
+            cart_id=row["cart_id"], product_id=row["product_id"]
+        ).exclude(pk=row["keep"]).delete()
+
+    # One review per customer and product: the newest approved one, else the
+    # newest. Run ``manage.py rebuild_ratings`` afterwards if any were removed.
+    reviews = (
+        Comment.objects.values("customer_id", "product_id")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for row in reviews.order_by():
+        comments = Comment.objects.filter(
+            customer_id=row["customer_id"], product_id=row["product_id"]
+        )
+        keep = comments.order_by("-is_approved", "-created_at", "-id").first()
+        comments.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0023_numeric_discount"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_catalog_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_price_idx",
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("is_approved", True)),
+                fields=["product", "-created_at"],
+                name="comment_approved_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_enable", True)),
+                fields=["created_at", "id"],
+                name="product_catalog_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_enable", True)),
+                fields=["effective_price", "id"],
+                name="product_price_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cart",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("customer",),
+                name="cart_one_active_per_customer",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="cartitem_unique_product"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="comment",
+            constraint=models.UniqueConstraint(
+                fields=("customer", "product"), name="comment_unique_customer"
+            ),
+        ),
+    ]
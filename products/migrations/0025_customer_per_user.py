@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_customers(apps, schema_editor):
+    """Give every existing user the Customer row new users now get on signup"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Customer = apps.get_model("products", "Customer")
+    users = User.objects.filter(customer__isnull=True).only(
+        "id", "email", "phone_number"
+    )
+    Customer.objects.bulk_create(
+        [
+            Customer(
+                user_id=user.pk,
+                first_name="FirstName",
+                last_name="LastName",
+                email=user.email or "example@example.com",
+                phone=(user.phone_number or "00000000000")[:11],
+            )
+            for user in users.iterator(chunk_size=500)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0024_hot_path_constraints"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_customers, migrations.RunPython.noop),
+    ]
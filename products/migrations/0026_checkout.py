@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:31
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_prices(apps, schema_editor):
+    """Existing order lines take the product's current price"""
+    OrderItem = apps.get_model("products", "OrderItem")
+    Product = apps.get_model("products", "Product")
+    OrderItem.objects.update(
+        price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("effective_price")[
+                :1
+            ]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0025_customer_per_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="idempotency_key",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="price",
+            field=models.IntegerField(blank=True, default=0, verbose_name="unit price"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="order",
+            name="date",
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddConstraint(
+            model_name="order",
+            constraint=models.UniqueConstraint(
+                fields=("customer", "idempotency_key"), name="order_idempotency_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:34
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_from_created_at(apps, schema_editor):
+    # Existing carts would otherwise all look freshly used
+    Cart = apps.get_model("products", "Cart")
+    Cart.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0027_stock_reservations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(start_from_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0028_cart_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategorySalesDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="date")),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="units sold"),
+                ),
+                ("revenue", models.BigIntegerField(default=0, verbose_name="revenue")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(default=0, verbose_name="orders"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.category",
+                        verbose_name="category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "daily category sales",
+                "verbose_name_plural": "daily category sales",
+                "indexes": [
+                    models.Index(
+                        fields=["category", "date"], name="category_sales_category_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "category"), name="category_sales_daily_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSalesDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="date")),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="units sold"),
+                ),
+                ("revenue", models.BigIntegerField(default=0, verbose_name="revenue")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(default=0, verbose_name="orders"),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="products.product",
+                        verbose_name="product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "daily product sales",
+                "verbose_name_plural": "daily product sales",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "date"], name="product_sales_product_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "product"), name="product_sales_daily_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:11
+
+from django.db import migrations, models
+
+
+def fix_discounts(apps, schema_editor):
+    """Make rows written past Product.clean() satisfy the new constraints"""
+    Product = apps.get_model("products", "Product")
+    # effective_price already preferred the sale price, keep that one
+    Product.objects.filter(
+        sale_price__isnull=False, discount_percent__isnull=False
+    ).update(discount_percent=None)
+    # A "sale" price at or above the price is no discount, drop it
+    Product.objects.filter(sale_price__gte=models.F("price")).update(sale_price=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0029_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_discounts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("sale_price__isnull", True),
+                    ("discount_percent__isnull", True),
+                    _connector="OR",
+                ),
+                name="product_single_discount",
+                violation_error_message="Set either a sale price or a discount percent, not both.",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("sale_price__isnull", True),
+                    ("sale_price__lt", models.F("price")),
+                    _connector="OR",
+                ),
+                name="product_sale_below_price",
+                violation_error_message="The sale price must be below the price.",
+            ),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.conf.urls.static import static
@@ -32,7 +36,19 @@ class BaseDigitalModel(models.Model):
             return static("static/img/default_product.png")
 
 
+class CategoryQuerySet(models.QuerySet):
+    def enabled(self):
+        return self.filter(is_enable=True)
+
+    def subtree(self, category):
+        """``category`` and all of its descendants, one indexed prefix scan"""
+        return self.filter(path__startswith=category.path)
+
+
 class Category(BaseDigitalModel):
+    # Width of one zero-padded id segment in ``path``
+    PATH_STEP = 10
+
     parent = models.ForeignKey(
         "self",
         verbose_name=_("parent"),
@@ -40,11 +56,124 @@ class Category(BaseDigitalModel):
         null=True,
         on_delete=models.CASCADE,
     )
+    # Materialized path of ancestor ids, e.g. "0000000001/0000000004/"
+    path = models.CharField(
+        _("path"), max_length=255, db_index=True, editable=False, default=""
+    )
+    depth = models.PositiveSmallIntegerField(_("depth"), default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
 
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and self.parent_path().startswith(self.path):
+            raise ValidationError(
+                {"parent": _("A category cannot be moved below itself.")}
+            )
+
+    def parent_path(self):
+        if not self.parent_id:
+            return ""
+        # Read from the database, a cached parent instance may have moved
+        return Category.objects.values_list("path", flat=True).get(pk=self.parent_id)
+
+    def build_path(self, parent_path):
+        """``(path, depth)`` of this saved category below ``parent_path``"""
+        path = f"{parent_path}{self.pk:0{self.PATH_STEP}d}/"
+        return path, path.count("/") - 1
+
+    def save(self, *args, **kwargs):
+        """Save and keep ``path``/``depth`` of this subtree in sync"""
+        with transaction.atomic():
+            old_path, old_depth = "", 0
+            if self.pk:
+                old_path, old_depth = Category.objects.filter(pk=self.pk).values_list(
+                    "path", "depth"
+                ).first() or ("", 0)
+            parent_path = self.parent_path()
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError("A category cannot be moved below itself.")
+
+            super().save(*args, **kwargs)
+
+            new_path, new_depth = self.build_path(parent_path)
+            self.path, self.depth = new_path, new_depth
+            if new_path == old_path:
+                return
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+            if old_path:
+                # Re-root every descendant under the new prefix in one UPDATE
+                Category.objects.filter(path__startswith=old_path).exclude(
+                    pk=self.pk
+                ).update(
+                    path=Concat(
+                        models.Value(new_path), Substr("path", len(old_path) + 1)
+                    ),
+                    depth=models.F("depth") + (new_depth - old_depth),
+                )
+
+    def get_descendants(self, include_self=True):
+        descendants = Category.objects.subtree(self)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+
+class ProductQuerySet(models.QuerySet):
+    """Shared catalog queries used by the listing views and the API"""
+
+    # Columns rendered by the product cards in index.html and store.html,
+    # updated_at is part of the card fragment cache key
+    CARD_FIELDS = (
+        "id",
+        "title",
+        "avatar",
+        "created_at",
+        "updated_at",
+        "stars",
+        "rating_avg",
+        "rating_count",
+        "price",
+        "is_stock",
+        "is_new",
+        "is_off",
+        "sale_price",
+        "discount_percent",
+        "effective_price",
+    )
+
+    def enabled(self):
+        return self.filter(is_enable=True)
+
+    def with_categories(self):
+        return self.prefetch_related(
+            models.Prefetch("categories", queryset=Category.objects.only("id", "title"))
+        )
+
+    def catalog(self):
+        """Enabled products with categories prefetched, newest first"""
+        return (
+            self.enabled()
+            .with_categories()
+            .defer("search_vector")
+            .order_by("-created_at", "-id")
+        )
+
+    def for_cards(self):
+        """Catalog queryset restricted to the columns the product cards need"""
+        return self.catalog().only(*self.CARD_FIELDS)
+
+    def in_category(self, category):
+        """Products anywhere in ``category``'s subtree, without duplicates"""
+        links = self.model.categories.through.objects.filter(
+            category__path__startswith=category.path
+        )
+        return self.filter(pk__in=links.values("product_id"))
+
 
 class Product(BaseDigitalModel):
     categories = models.ManyToManyField(
@@ -53,19 +182,193 @@ class Product(BaseDigitalModel):
     stars = models.IntegerField(_("star count"), default=0, blank=True)
     price = models.IntegerField(_("price"))
     is_stock = models.BooleanField(_("in stock?"), default=True)
+    # Units left for sale, blank for unlimited (the usual case for digital
+    # goods). Only ever changed with conditional UPDATEs in products.stock,
+    # save() leaves it alone (see MAINTAINED_FIELDS)
+    stock = models.PositiveIntegerField(_("stock"), blank=True, null=True)
     is_new = models.BooleanField(_("is new product?"), default=True)
     is_off = models.BooleanField(_("product have off?"), default=False)
-    off_price = models.CharField(_("off price"), max_length=50, blank=True, null=True)
+    # A discount is either a fixed sale price or a percentage off ``price``,
+    # and only applies while ``is_off`` is set
+    sale_price = models.PositiveIntegerField(_("sale price"), blank=True, null=True)
+    discount_percent = models.PositiveSmallIntegerField(
+        _("discount percent"),
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1), MaxValueValidator(99)],
+    )
+    # Price actually charged, stored so it can be indexed, sorted and filtered
+    effective_price = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                is_off=True, sale_price__isnull=False, then=models.F("sale_price")
+            ),
+            models.When(
+                is_off=True,
+                discount_percent__isnull=False,
+                then=models.F("price") * (100 - models.F("discount_percent")) / 100,
+            ),
+            default=models.F("price"),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+        verbose_name=_("effective price"),
+    )
+
+    # Denormalized from approved comments, maintained by products.ratings;
+    # save() leaves them alone (see MAINTAINED_FIELDS)
+    rating_avg = models.FloatField(_("rating average"), default=0, editable=False)
+    rating_count = models.PositiveIntegerField(
+        _("rating count"), default=0, editable=False
+    )
+    rating_1 = models.PositiveIntegerField(
+        _("1 star ratings"), default=0, editable=False
+    )
+    rating_2 = models.PositiveIntegerField(
+        _("2 star ratings"), default=0, editable=False
+    )
+    rating_3 = models.PositiveIntegerField(
+        _("3 star ratings"), default=0, editable=False
+    )
+    rating_4 = models.PositiveIntegerField(
+        _("4 star ratings"), default=0, editable=False
+    )
+    rating_5 = models.PositiveIntegerField(
+        _("5 star ratings"), default=0, editable=False
+    )
+
+    # PostgreSQL full-text index maintained by products.search, GIN indexed
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    # Written by UPDATEs elsewhere (products.stock, products.ratings) while an
+    # instance may be loaded: a save() writing back its copy would undo them
+    MAINTAINED_FIELDS = (
+        "stock",
+        "rating_avg",
+        "rating_count",
+        *(f"rating_{stars}" for stars in range(1, 6)),
+    )
 
     def stars_range(self):
+        if self.rating_count:
+            return range(round(self.rating_avg))
         return range(self.stars)
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = self.saved_fields()
+        super().save(*args, **kwargs)
+
+    def saved_fields(self):
+        """Fields a plain save() of a stored product writes"""
+        deferred = self.get_deferred_fields()
+        skipped = set(self.MAINTAINED_FIELDS) | deferred
+        if "stock" not in deferred and self.stock is not None:
+            # Follows the stock count of limited products
+            skipped.add("is_stock")
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and not field.generated
+            and field.attname not in skipped
+        ]
+
+    def clean(self):
+        super().clean()
+        self.clean_discount()
+
+    def clean_discount(self):
+        """
+        The discount rules, also checked by the database (``Meta.constraints``).
+        Errors are bound to a field so ``full_clean()`` reports them once.
+        """
+        if self.sale_price is not None and self.discount_percent is not None:
+            raise ValidationError(
+                {
+                    "discount_percent": _(
+                        "Set either a sale price or a discount percent, not both."
+                    )
+                }
+            )
+        if self.sale_price is not None and self.price is not None:
+            if self.sale_price >= self.price:
+                raise ValidationError(
+                    {"sale_price": _("The sale price must be below the price.")}
+                )
+
+    @property
+    def has_discount(self):
+        return self.is_off and (
+            self.sale_price is not None or self.discount_percent is not None
+        )
+
+    def discount_label(self):
+        """Whole percent saved, for the "-30%" badge on product cards"""
+        if not self.has_discount or not self.price:
+            return 0
+        return round(100 * (self.price - self.effective_price) / self.price)
+
+    def rating_histogram(self):
+        """Rows for the product page rating widget, five stars first"""
+        rows = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f"rating_{stars}")
+            rows.append(
+                {
+                    "stars": stars,
+                    "count": count,
+                    "percent": (
+                        round(100 * count / self.rating_count)
+                        if self.rating_count
+                        else 0
+                    ),
+                    "filled": range(stars),
+                    "empty": range(5 - stars),
+                }
+            )
+        return rows
+
     def get_absolute_url(self):
         return reverse("Product_detail", kwargs={"pk": self.pk})
 
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        indexes = [
+            # Serves the catalog filter plus the (created_at, id) keyset seek.
+            # Partial rather than leading with is_enable: a bare boolean
+            # predicate cannot seek an index column on every backend
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(is_enable=True),
+                name="product_catalog_idx",
+            ),
+            # Price sorting, keyset seek and price-range filtering
+            models.Index(
+                fields=["effective_price", "id"],
+                condition=models.Q(is_enable=True),
+                name="product_price_idx",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(sale_price__isnull=True)
+                | models.Q(discount_percent__isnull=True),
+                name="product_single_discount",
+                violation_error_message=_(
+                    "Set either a sale price or a discount percent, not both."
+                ),
+            ),
+            models.CheckConstraint(
+                condition=models.Q(sale_price__isnull=True)
+                | models.Q(sale_price__lt=models.F("price")),
+                name="product_sale_below_price",
+                violation_error_message=_("The sale price must be below the price."),
+            ),
+        ]
 
 
 class File(BaseDigitalModel):
@@ -106,36 +409,115 @@ class Customer(models.Model):
         return reverse("Category_detail", kwargs={"pk": self.pk})
 
 
+class LineItemQuerySet(models.QuerySet):
+    """
+    Cart and order lines priced in SQL. Line models name the column holding
+    their unit price in ``UNIT_PRICE``: the live product price for carts, the
+    price snapshot taken at checkout for orders.
+    """
+
+    def with_line_total(self):
+        return self.annotate(
+            line_total=models.F("quantity") * models.F(self.model.UNIT_PRICE)
+        )
+
+
+class ItemTotalsQuerySet(models.QuerySet):
+    """Carts and orders annotated with the sum of their ``items``"""
+
+    def with_totals(self):
+        unit_price = self.model._meta.get_field("items").related_model.UNIT_PRICE
+        return self.annotate(
+            total_price=Coalesce(
+                models.Sum(
+                    models.F("items__quantity") * models.F(f"items__{unit_price}")
+                ),
+                0,
+            ),
+            item_count=Coalesce(models.Sum("items__quantity"), 0),
+        )
+
+    def with_items(self):
+        """Prefetch the lines, priced with ``with_line_total()``, in one query"""
+        items = self.model._meta.get_field("items").related_model
+        return self.prefetch_related(
+            models.Prefetch(
+                "items", queryset=items.objects.with_line_total().order_by("id")
+            )
+        )
+
+
+def items_total(owner):
+    """``total_price`` annotated by ``with_totals()``, else one aggregate query"""
+    total = getattr(owner, "total_price", None)
+    if total is None:
+        unit_price = owner.items.model.UNIT_PRICE
+        total = owner.items.aggregate(
+            total=Coalesce(models.Sum(models.F("quantity") * models.F(unit_price)), 0)
+        )["total"]
+    return total
+
+
+def line_total(item):
+    total = getattr(item, "line_total", None)
+    if total is None:
+        total = item.get_unit_price() * item.quantity
+    return total
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     address = models.TextField()
     phone = models.CharField(max_length=11, blank=True)
-    date = models.DateField(default=timezone.now())
+    date = models.DateField(default=timezone.localdate)
 
     status = models.BooleanField(default=False)
     shipped_date = models.DateTimeField(null=True, blank=True)
+    # Client-supplied checkout token, a resubmitted checkout returns this order
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    objects = ItemTotalsQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("order")
         verbose_name_plural = _("orders")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["customer", "idempotency_key"], name="order_idempotency_key"
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.customer.first_name}"
 
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return items_total(self)
 
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Unit price when the order was placed, later price changes don't apply
+    price = models.IntegerField(_("unit price"), blank=True)
+
+    UNIT_PRICE = "price"
+
+    objects = LineItemQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.quantity} x {self.product.title}"
 
+    def save(self, *args, **kwargs):
+        if self.price is None:
+            self.price = self.product.effective_price
+        super().save(*args, **kwargs)
+
+    def get_unit_price(self):
+        return self.price
+
     def get_total_price(self):
-        return self.product.price * self.quantity
+        return line_total(self)
 
 
 class Contact(models.Model):
@@ -157,13 +539,27 @@ class Contact(models.Model):
 class Cart(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last change to the cart or its lines, abandoned carts are purged on it
+    updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    objects = ItemTotalsQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # A customer has at most one open cart, found by the lookup below
+            models.UniqueConstraint(
+                fields=["customer"],
+                condition=models.Q(is_active=True),
+                name="cart_one_active_per_customer",
+            ),
+        ]
+
     def __str__(self):
         return f"Cart #{self.id} - Customer: {self.customer.first_name}"
 
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return items_total(self)
 
 
 class CartItem(models.Model):
@@ -171,11 +567,112 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    UNIT_PRICE = "product__effective_price"
+
+    objects = LineItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="cartitem_unique_product"
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
+        return f"{self.quantity} x {self.product.title}"
+
+    def get_unit_price(self):
+        return self.product.effective_price
 
     def get_total_price(self):
-        return self.product.price * self.quantity
+        return line_total(self)
+
+
+class SalesRollup(models.Model):
+    """Daily sales totals, maintained by products.sales as orders are placed"""
+
+    date = models.DateField(_("date"))
+    units = models.PositiveIntegerField(_("units sold"), default=0)
+    revenue = models.BigIntegerField(_("revenue"), default=0)
+    orders = models.PositiveIntegerField(_("orders"), default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ProductSalesDaily(SalesRollup):
+    product = models.ForeignKey(
+        Product, verbose_name=_("product"), on_delete=models.CASCADE
+    )
+
+    class Meta:
+        verbose_name = _("daily product sales")
+        verbose_name_plural = _("daily product sales")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "product"], name="product_sales_daily_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["product", "date"], name="product_sales_product_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.units} units"
+
+
+class CategorySalesDaily(SalesRollup):
+    """A product sold counts towards each category it is directly in"""
+
+    category = models.ForeignKey(
+        Category, verbose_name=_("category"), on_delete=models.CASCADE
+    )
+
+    class Meta:
+        verbose_name = _("daily category sales")
+        verbose_name_plural = _("daily category sales")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "category"], name="category_sales_daily_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["category", "date"], name="category_sales_category_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} on {self.date}: {self.units} units"
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for a cart during checkout. The units are taken
+    off ``Product.stock`` when the hold is made; placing the order keeps
+    them, the sweeper in products.stock gives them back once ``expires_at``
+    passes.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    # Kept when the cart goes away so the sweeper still returns the units
+    cart = models.ForeignKey(
+        Cart, on_delete=models.SET_NULL, null=True, related_name="reservations"
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"], name="reservation_unique_product"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at}"
 
 
 class Comment(models.Model):
@@ -196,6 +693,19 @@ class Comment(models.Model):
     class Meta:
         verbose_name = _("Comment")
         verbose_name_plural = _("Comments")
+        indexes = [
+            # Approved comments of one product, newest first (product page)
+            models.Index(
+                fields=["product", "-created_at"],
+                condition=models.Q(is_approved=True),
+                name="comment_approved_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["customer", "product"], name="comment_unique_customer"
+            ),
+        ]
 
     def __str__(self):
         return f"Comment by {self.customer} on {self.product}"
@@ -0,0 +1,224 @@
+"""
+Keyset (seek) pagination for the product catalog.
+
+Pages are ordered newest first on ``(created_at, id)`` by default and
+addressed by an opaque cursor holding the sort key of the row at the page
+boundary, so page N costs the same index range scan as page 1 and no
+``COUNT(*)`` is issued. Any other ordering works as long as it ends in a
+unique column, e.g. ``("-search_rank", "-id")`` for ranked search results.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import GeneratedField, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Seek through ``queryset`` in ``ordering``, ``per_page`` rows at a time"""
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+    def encode_cursor(self, obj, reverse=False):
+        """Opaque cursor pointing just after (or, reversed, before) ``obj``"""
+        values = [_dump(getattr(obj, name)) for name, _ in self.fields]
+        raw = json.dumps([int(reverse), values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Return ``(values, reverse)`` or raise InvalidCursor"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            reverse, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError("cursor does not match ordering")
+            return [
+                self._load(name, value) for (name, _), value in zip(self.fields, values)
+            ], bool(reverse)
+        except (binascii.Error, TypeError, ValueError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _load(self, name, value):
+        if value is None:
+            raise ValueError(f"cursor has no value for {name}")
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are plain JSON numbers
+            if isinstance(value, bool):
+                raise ValueError(f"cursor has a non-numeric {name}")
+            return float(value)
+        if isinstance(field, GeneratedField):
+            field = field.output_field
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(f"cursor has no value for {name}")
+        return value
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = self._fetch(self.queryset.order_by(*self.ordering))
+            has_more = len(rows) > self.per_page
+            rows = rows[: self.per_page]
+            return KeysetPage(rows, next_cursor=self._next(rows, has_more))
+
+        values, reverse = self.decode_cursor(cursor)
+        try:
+            rows = self._fetch(self._seek(values, reverse))
+        except (TypeError, ValueError, ValidationError) as exc:
+            # Anything decode_cursor let through that the lookups reject
+            raise InvalidCursor(cursor) from exc
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not reverse:
+            return KeysetPage(
+                rows,
+                next_cursor=self._next(rows, has_more),
+                previous_cursor=self._previous(rows, True),
+            )
+        rows = rows[::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=self._next(rows, True),
+            previous_cursor=self._previous(rows, has_more),
+        )
+
+    def _seek(self, values, reverse):
+        """Rows strictly after ``values`` (before, if reversed) in ordering"""
+        condition, equal = Q(), {}
+        for (name, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                name if descending else f"-{name}" for name, descending in self.fields
+            ]
+        return self.queryset.filter(condition).order_by(*ordering)
+
+    def _fetch(self, queryset):
+        # One extra row tells us whether another page exists without a COUNT
+        return list(queryset[: self.per_page + 1])
+
+    def _next(self, rows, has_more):
+        return self.encode_cursor(rows[-1]) if rows and has_more else None
+
+    def _previous(self, rows, has_more):
+        if rows and has_more:
+            return self.encode_cursor(rows[0], reverse=True)
+        return None
+
+
+def get_keyset_ordering(view, default=DEFAULT_ORDERING):
+    """Ordering declared by ``view.get_keyset_ordering()``, if any"""
+    if view is not None and hasattr(view, "get_keyset_ordering"):
+        return view.get_keyset_ordering()
+    return default
+
+
+class KeysetPagination(BasePagination):
+    """DRF pagination class backed by KeysetPaginator"""
+
+    page_size = 20
+    cursor_query_param = "cursor"
+    ordering = DEFAULT_ORDERING
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        paginator = KeysetPaginator(
+            queryset, self.page_size, get_keyset_ordering(view, self.ordering)
+        )
+        try:
+            self.page = paginator.page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound("Invalid cursor")
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+def page_url(request, cursor, param="cursor"):
+    """Current URL with ``param`` set to ``cursor``, or None without a cursor"""
+    if cursor is None:
+        return None
+    return replace_query_param(request.get_full_path(), param, cursor)
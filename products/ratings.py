@@ -0,0 +1,110 @@
+"""
+Denormalized product ratings.
+
+``Product.rating_avg``, ``rating_count`` and the ``rating_1`` .. ``rating_5``
+histogram are adjusted with a single UPDATE whenever an approved comment is
+added, removed or changes, and can be rebuilt in bulk from ``Comment``.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast, Now
+
+from .models import Comment, Product
+
+RATING_STARS = range(1, 6)
+
+
+def rating_bucket(stars):
+    """Histogram bucket for a comment, clamped to 1..5"""
+    return min(max(stars or 0, 1), 5)
+
+
+def adjust_rating(product_id, stars, delta):
+    """Add (``delta=1``) or remove (``delta=-1``) one rating of ``stars``"""
+    bucket = rating_bucket(stars)
+    counts = {
+        s: F(f"rating_{s}") + delta if s == bucket else F(f"rating_{s}")
+        for s in RATING_STARS
+    }
+    total = sum(counts[s] * s for s in RATING_STARS)
+    # Every right-hand side reads the pre-update row, so the new average is
+    # expressed in terms of the old counters plus ``delta``
+    Product.objects.filter(pk=product_id).update(
+        rating_count=F("rating_count") + delta,
+        rating_avg=Case(
+            When(rating_count=-delta, then=Value(0.0)),
+            default=Cast(total, FloatField())
+            / Cast(F("rating_count") + delta, FloatField()),
+            output_field=FloatField(),
+        ),
+        **{f"rating_{bucket}": counts[bucket]},
+        # Ratings show on the product cards, whose cache key is updated_at
+        updated_at=Now(),
+    )
+
+
+def rating_state(comment):
+    """``(product_id, bucket)`` if ``comment`` counts towards ratings"""
+    if comment is None or not comment["is_approved"]:
+        return None
+    return comment["product_id"], rating_bucket(comment["stars"])
+
+
+def apply_comment_change(previous, current):
+    """Move a rating between products/buckets for a comment state change"""
+    old, new = rating_state(previous), rating_state(current)
+    if old == new:
+        return
+    if old is not None:
+        adjust_rating(old[0], old[1], -1)
+    if new is not None:
+        adjust_rating(new[0], new[1], 1)
+
+
+def ratings_for(product_ids=None):
+    """Aggregate approved comments into ``{product_id: {bucket: count}}``"""
+    comments = Comment.objects.filter(is_approved=True)
+    if product_ids is not None:
+        comments = comments.filter(product_id__in=product_ids)
+    histograms = {}
+    rows = comments.values("product_id", "stars").annotate(n=Count("id"))
+    for row in rows.order_by():
+        histogram = histograms.setdefault(
+            row["product_id"], dict.fromkeys(RATING_STARS, 0)
+        )
+        histogram[rating_bucket(row["stars"])] += row["n"]
+    return histograms
+
+
+def rebuild_ratings(product_ids=None, batch_size=500):
+    """Recompute stored ratings from comments, returns products touched"""
+    fields = ["rating_avg", "rating_count", "updated_at"]
+    fields += [f"rating_{s}" for s in RATING_STARS]
+    now = timezone.now()
+    products = Product.objects.only("id", *fields).order_by("pk")
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+
+    with transaction.atomic():
+        histograms = ratings_for(product_ids)
+        batch, touched = [], 0
+        for product in products.iterator(chunk_size=batch_size):
+            histogram = histograms.get(product.pk, dict.fromkeys(RATING_STARS, 0))
+            count = sum(histogram.values())
+            total = sum(s * n for s, n in histogram.items())
+            product.rating_count = count
+            product.rating_avg = total / count if count else 0
+            for s in RATING_STARS:
+                setattr(product, f"rating_{s}", histogram[s])
+            product.updated_at = now
+            batch.append(product)
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, fields)
+                touched += len(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, fields)
+            touched += len(batch)
+    return touched
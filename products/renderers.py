@@ -0,0 +1,97 @@
+"""
+Faster API renderers and parsers.
+
+``FastJSONRenderer``/``FastJSONParser`` produce and accept the same JSON as
+DRF's ``JSONRenderer``/``JSONParser`` but encode with orjson, which
+serializes a product list several times faster than ``json.dumps`` with
+DRF's encoder class. Types orjson does not know (lazy translations,
+``Decimal``) and dates and times go through DRF's encoder. Without orjson
+installed, or when asked to indent (the browsable API), they fall back to
+the stock classes.
+
+``MessagePackRenderer``/``MessagePackParser`` speak ``application/msgpack``
+when the optional ``msgpack`` package is installed; settings only list them
+then. Clients choose a format with the ``Accept`` header, see
+``manage.py benchmark_renderers`` for sizes and timings.
+"""
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Characters DRF escapes so its JSON is also valid JavaScript
+JS_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+def _default(obj):
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        # orjson only writes compact UTF-8
+        plain = self.compact and not self.ensure_ascii
+        if orjson is None or indent is not None or not plain:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        # Dates and times go through DRF's encoder, which writes "Z" for UTC
+        # and keeps milliseconds only
+        ret = orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        for raw, escaped in JS_LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8").lower()
+        if orjson is None or encoding not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_default)
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
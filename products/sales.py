@@ -0,0 +1,138 @@
+"""
+Daily sales rollups.
+
+``ProductSalesDaily`` and ``CategorySalesDaily`` hold units, revenue and
+order counts per day, so reports read a few small rows instead of scanning
+the order history. ``place_order`` calls ``record_order_sales()`` in its
+transaction, which upserts today's rows with a fixed number of queries (an
+``INSERT .. ON CONFLICT DO NOTHING`` plus one incrementing UPDATE per table).
+
+``rebuild_sales()`` recomputes the rollups from ``OrderItem`` in date
+chunks, e.g. after a backfill or a category reshuffle: incremental rows
+attribute sales to the categories a product had when it was sold, a rebuild
+to the categories it has now.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    F,
+    IntegerField,
+    Max,
+    Min,
+    Sum,
+    Value,
+    When,
+)
+
+from .models import CategorySalesDaily, Order, OrderItem, Product, ProductSalesDaily
+
+ROLLUP_FIELDS = ("units", "revenue", "orders")
+
+
+def _increment(model, key, date, totals):
+    """Add ``{key_id: (units, revenue, orders)}`` to ``model``'s rows of ``date``"""
+    if not totals:
+        return
+    model.objects.bulk_create(
+        [model(date=date, **{f"{key}_id": key_id}) for key_id in totals],
+        ignore_conflicts=True,
+    )
+    increments = {}
+    for position, field in enumerate(ROLLUP_FIELDS):
+        increments[field] = F(field) + Case(
+            *[
+                When(**{f"{key}_id": key_id}, then=Value(values[position]))
+                for key_id, values in totals.items()
+            ],
+            default=Value(0),
+            output_field=BigIntegerField() if field == "revenue" else IntegerField(),
+        )
+    model.objects.filter(date=date, **{f"{key}_id__in": totals}).update(**increments)
+
+
+def record_order_sales(date, lines):
+    """
+    Add one order's ``(product_id, quantity, unit_price)`` lines to the
+    rollups of ``date``.
+    """
+    products = {}
+    for product_id, quantity, price in lines:
+        units, revenue, _ = products.get(product_id, (0, 0, 1))
+        products[product_id] = (units + quantity, revenue + quantity * price, 1)
+
+    categories = defaultdict(lambda: [0, 0, 1])
+    links = Product.categories.through.objects.filter(product_id__in=products)
+    for product_id, category_id in links.values_list("product_id", "category_id"):
+        units, revenue, _ = products[product_id]
+        categories[category_id][0] += units
+        categories[category_id][1] += revenue
+
+    _increment(ProductSalesDaily, "product", date, products)
+    _increment(
+        CategorySalesDaily,
+        "category",
+        date,
+        {category_id: tuple(values) for category_id, values in categories.items()},
+    )
+
+
+def _aggregate(items, group):
+    return items.values("order__date", group).annotate(
+        units=Sum("quantity"),
+        revenue=Sum(F("quantity") * F("price")),
+        orders=Count("order", distinct=True),
+    )
+
+
+def rebuild_sales(start=None, end=None, chunk_days=31, progress=None):
+    """
+    Recompute the rollups for orders dated ``start``..``end`` (default: all
+    orders), one transaction per ``chunk_days`` window. Returns the number
+    of rollup rows written.
+    """
+    if start is None or end is None:
+        bounds = Order.objects.aggregate(first=Min("date"), last=Max("date"))
+        start = start or bounds["first"]
+        end = end or bounds["last"]
+    written = 0
+    if start is None or end is None:
+        return written
+
+    day = start
+    while day <= end:
+        last = min(day + timedelta(days=chunk_days - 1), end)
+        items = OrderItem.objects.filter(order__date__range=(day, last)).order_by()
+        with transaction.atomic():
+            ProductSalesDaily.objects.filter(date__range=(day, last)).delete()
+            CategorySalesDaily.objects.filter(date__range=(day, last)).delete()
+            rows = ProductSalesDaily.objects.bulk_create(
+                ProductSalesDaily(
+                    date=row["order__date"],
+                    product_id=row["product"],
+                    **{field: row[field] for field in ROLLUP_FIELDS},
+                )
+                for row in _aggregate(items, "product").iterator()
+            )
+            written += len(rows)
+            rows = CategorySalesDaily.objects.bulk_create(
+                CategorySalesDaily(
+                    date=row["order__date"],
+                    category_id=row["product__categories"],
+                    **{field: row[field] for field in ROLLUP_FIELDS},
+                )
+                for row in _aggregate(
+                    items.filter(product__categories__isnull=False),
+                    "product__categories",
+                ).iterator()
+            )
+            written += len(rows)
+        if progress is not None:
+            progress(day, last, written)
+        day = last + timedelta(days=1)
+    return written
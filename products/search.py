@@ -0,0 +1,186 @@
+"""
+Ranked full-text product search.
+
+Products are indexed on title (highest weight), description and the titles
+of their categories. The backend follows the database in use:
+
+* PostgreSQL keeps a stored ``Product.search_vector`` tsvector column with a
+  GIN index (created in migration 0022) and ranks with ``ts_rank``.
+* SQLite keeps an FTS5 shadow table ``products_product_fts`` keyed by
+  product id and ranks with ``bm25``.
+* Anything else falls back to unranked ``icontains`` matching.
+
+``search_products()`` annotates matches with ``search_rank`` (higher is better) so
+callers can order or keyset-paginate on ``("-search_rank", "-id")``.
+The index is kept in sync by the signals in ``products.signals``.
+"""
+
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import Product
+
+SEARCH_ORDERING = ("-search_rank", "-id")
+SEARCH_CONFIG = "english"
+MAX_TERMS = 10
+
+
+def search_terms(query):
+    """Lower-cased word tokens of a user query, capped at MAX_TERMS"""
+    return re.findall(r"\w+", (query or "").lower())[:MAX_TERMS]
+
+
+class BaseSearchBackend:
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index(self, product_ids):
+        """(Re)index the given products"""
+
+    def remove(self, product_ids):
+        """Drop the given products from the index"""
+
+    def rebuild(self, batch_size=1000):
+        """Reindex every product in primary key ranges, returns rows indexed"""
+        ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(ids), batch_size):
+            self.index(ids[start : start + batch_size])
+        return len(ids)
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for databases without a full-text engine"""
+
+    def search(self, queryset, query):
+        condition = Q()
+        for term in search_terms(query):
+            condition &= (
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(categories__title__icontains=term)
+            )
+        matches = Product.objects.filter(condition).values("pk")
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    def search(self, queryset, query):
+        search_query = SearchQuery(
+            " ".join(search_terms(query)), search_type="plain", config=SEARCH_CONFIG
+        )
+        # ts_rank is a float4, compared with a cursor's float8 it never equals
+        # itself; as a float8 the value round-trips through the cursor exactly
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=Cast(SearchRank(F("search_vector"), search_query), FloatField())
+        )
+
+    def index(self, product_ids):
+        category_titles = (
+            Product.categories.through.objects.filter(product_id=OuterRef("pk"))
+            .values("product_id")
+            .annotate(titles=StringAgg("category__title", " "))
+            .values("titles")
+        )
+        Product.objects.filter(pk__in=product_ids).update(
+            search_vector=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(category_titles), weight="C", config=SEARCH_CONFIG
+            )
+        )
+
+    def remove(self, product_ids):
+        # The vector lives on the product row and goes away with it
+        pass
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    table = "products_product_fts"
+
+    def match_expression(self, query):
+        # Quote every token so user input can never be parsed as FTS5 syntax
+        return " ".join(f'"{term}"*' for term in search_terms(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        matches = RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", (match,)
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}, 10.0, 5.0, 2.0) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = products_product.id",
+            (match,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+    def index(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                product_ids,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table} (rowid, title, description, categories)
+                SELECT p.id, p.title, p.description, COALESCE((
+                    SELECT group_concat(c.title, ' ')
+                    FROM products_product_categories pc
+                    JOIN products_category c ON c.id = pc.category_id
+                    WHERE pc.product_id = p.id
+                ), '')
+                FROM products_product p
+                WHERE p.id IN ({placeholders})
+                """,
+                product_ids,
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})",
+                product_ids,
+            )
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    return SEARCH_BACKENDS.get(connection.vendor, LikeSearchBackend)()
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to matches for ``query``, annotated with search_rank"""
+    if not search_terms(query):
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    return get_search_backend().search(queryset, query)
+
+
+def index_products(product_ids):
+    get_search_backend().index(product_ids)
+
+
+def remove_products(product_ids):
+    get_search_backend().remove(product_ids)
@@ -1,4 +1,8 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Prefetch
 from rest_framework import serializers
+
+from .fieldsets import Expand, SparseFieldsSerializerMixin
 from .models import (
     Category,
     Product,
@@ -10,24 +14,50 @@ from .models import (
     Customer,
     Order,
     OrderItem,
+    CategorySalesDaily,
+    ProductSalesDaily,
 )
 
 
-class CategorySerializer(serializers.ModelSerializer):
+def nested_product(relation):
+    """Expand ``relation`` to a ProductSerializer, categories prefetched"""
+    return Expand(
+        "ProductSerializer",
+        prefetch=[
+            Prefetch(
+                f"{relation}__categories",
+                queryset=Category.objects.only("id", "title"),
+            )
+        ],
+    )
+
+
+class CategorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {"parent": Expand("CategorySerializer")}
+
     class Meta:
         fields = "__all__"
         model = Category
 
 
-class FileSerializer(serializers.ModelSerializer):
+class FileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {"product": nested_product("product")}
+
     class Meta:
         model = File
         fields = "__all__"
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    categories = serializers.StringRelatedField(many=True)
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    categories = serializers.StringRelatedField(many=True, read_only=True)
     avatar = serializers.ImageField(read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
+
+    expandable_fields = {
+        "categories": Expand(CategorySerializer, many=True),
+        "images": Expand(FileSerializer, many=True),
+    }
+    field_columns = {"rating_histogram": [f"rating_{s}" for s in range(1, 6)]}
 
     class Meta:
         model = Product
@@ -42,38 +72,145 @@ class ProductSerializer(serializers.ModelSerializer):
             "stars",
             "price",
             "is_stock",
+            "stock",
             "is_new",
             "is_off",
-            "off_price",
+            "sale_price",
+            "discount_percent",
+            "effective_price",
             "categories",
+            "rating_avg",
+            "rating_count",
+            "rating_histogram",
         ]
+        # Changed through products.stock only, see the restock action
+        read_only_fields = ["stock"]
+
+    def get_rating_histogram(self, obj):
+        return {str(s): getattr(obj, f"rating_{s}") for s in range(1, 6)}
+
+    def validate(self, attrs):
+        # Product.clean() does not run on API writes (incl. /bulk/); the
+        # discount rules are also database constraints, check them up front
+        fields = ("price", "sale_price", "discount_percent")
+        product = Product(
+            **{
+                name: attrs.get(name, getattr(self.instance, name, None))
+                for name in fields
+            }
+        )
+        try:
+            product.clean_discount()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+        return attrs
+
+
+class RestockSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    # Read from the with_line_total() annotation when present
+    line_total = serializers.IntegerField(source="get_total_price", read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ["id", "product", "quantity", "line_total"]
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    line_total = serializers.IntegerField(source="get_total_price", read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ["id", "product", "quantity", "price", "line_total"]
+
+
+class CartSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    # Read from Cart.objects.with_totals() annotations when present
+    total_price = serializers.IntegerField(source="get_total_price", read_only=True)
+    items = CartItemSerializer(many=True, read_only=True)
 
+    expandable_fields = {"customer": Expand("CustomerSerializer")}
+    # Annotated by with_totals()
+    field_columns = {"total_price": ()}
 
-class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = "__all__"
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    total_price = serializers.IntegerField(source="get_total_price", read_only=True)
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    expandable_fields = {"customer": Expand("CustomerSerializer")}
+    field_columns = {"total_price": ()}
+
     class Meta:
         model = Order
         fields = "__all__"
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = "__all__"
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "product": nested_product("product"),
+        "customer": Expand(CustomerSerializer),
+    }
+
     class Meta:
         model = Comment
         fields = "__all__"
 
 
-class ContactSerializer(serializers.ModelSerializer):
+class ContactSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Contact
         fields = "__all__"
+
+
+class ProductSalesDailySerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
+    product_title = serializers.CharField(source="product.title", read_only=True)
+
+    expandable_fields = {"product": nested_product("product")}
+
+    class Meta:
+        model = ProductSalesDaily
+        fields = [
+            "id",
+            "date",
+            "product",
+            "product_title",
+            "units",
+            "revenue",
+            "orders",
+        ]
+
+
+class CategorySalesDailySerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
+    category_title = serializers.CharField(source="category.title", read_only=True)
+
+    expandable_fields = {"category": Expand(CategorySerializer)}
+
+    class Meta:
+        model = CategorySalesDaily
+        fields = [
+            "id",
+            "date",
+            "category",
+            "category_title",
+            "units",
+            "revenue",
+            "orders",
+        ]
@@ -0,0 +1,173 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .api_cache import invalidate_for_model
+from .cart import merge_session_cart
+from .cart_badge import invalidate_cart_badge
+from .category_tree import invalidate_category_tree
+from .customers import get_customer
+from .fragments import delete_product_cards, touch_products
+from .models import Category, Comment, File, Product
+from .ratings import apply_comment_change, rating_state
+from .search import index_products, remove_products
+
+RATING_FIELDS = {"product", "product_id", "stars", "is_approved"}
+
+
+def comment_state(comment):
+    return {
+        "product_id": comment.product_id,
+        "stars": comment.stars,
+        "is_approved": comment.is_approved,
+    }
+
+
+# -------------- Product ratings --------------
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_rating(sender, instance, update_fields=None, **kwargs):
+    instance._rating_previous = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not RATING_FIELDS & set(update_fields):
+        instance._rating_previous = comment_state(instance)
+        return
+    instance._rating_previous = (
+        Comment.objects.filter(pk=instance.pk)
+        .values("product_id", "stars", "is_approved")
+        .first()
+    )
+
+
+def rating_changed(previous, current):
+    apply_comment_change(previous, current)
+    if rating_state(previous) != rating_state(current):
+        # Ratings are updated in place, without a Product signal
+        transaction.on_commit(lambda: invalidate_for_model(Product))
+
+
+@receiver(post_save, sender=Comment)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rating_changed(getattr(instance, "_rating_previous", None), comment_state(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def update_rating_on_delete(sender, instance, **kwargs):
+    rating_changed(comment_state(instance), None)
+
+
+# -------------- Category tree --------------
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_tree_changed(sender, **kwargs):
+    # Wait for the path updates in Category.save to be visible to readers
+    transaction.on_commit(invalidate_category_tree)
+
+
+# -------------- Search index and product cards --------------
+
+
+def category_product_ids(category):
+    links = Product.categories.through.objects.filter(category=category)
+    return list(links.values_list("product_id", flat=True))
+
+
+def products_changed(product_ids):
+    """Category data shown on these products changed without a product save"""
+    index_products(product_ids)
+    touch_products(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    remove_products([instance.pk])
+    delete_product_cards([(instance.pk, instance.updated_at)])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    products_changed(category_product_ids(instance))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    # The cascading delete of the m2m rows does not send m2m_changed
+    instance._product_ids = category_product_ids(instance)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    products_changed(getattr(instance, "_product_ids", []))
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def product_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            products_changed([instance.pk])
+        return
+    # Category side: pk_set holds product ids, clear needs them captured first
+    if action == "pre_clear":
+        instance._cleared_product_ids = category_product_ids(instance)
+    elif action == "post_clear":
+        products_changed(getattr(instance, "_cleared_product_ids", []))
+    elif action in ("post_add", "post_remove"):
+        products_changed(pk_set)
+
+
+# -------------- API response cache --------------
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def api_data_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: invalidate_for_model(sender))
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def api_categories_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        transaction.on_commit(lambda: invalidate_for_model(Product))
+
+
+# -------------- Customers and session cart --------------
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_customer(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        get_customer(instance)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, "session"):
+        merge_session_cart(request, user)
+        invalidate_cart_badge(request, user)
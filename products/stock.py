@@ -0,0 +1,181 @@
+"""
+Limited stock without overselling.
+
+Stock is only ever changed with conditional UPDATEs. ``take_stock()`` issues
+a single ``UPDATE .. SET stock = stock - n WHERE id IN (..) AND stock >= n``
+for a whole cart and treats a short row count as a failure, so the database
+row lock held for one statement is the only serialization point; there is no
+read-modify-write window to oversell through. ``is_stock`` flips in the same
+statement and ``updated_at`` is bumped only then, to refresh product cards.
+``QuerySet.update()`` sends no signals, so a flip also drops the cached API
+responses (see products.api_cache); stock counts alone may lag there.
+
+Checkout holds stock with ``StockReservation`` rows for
+``STOCK_RESERVATION_MINUTES``. ``place_order`` converts a cart's holds into
+the order (taking or returning any difference), and
+``release_expired_reservations()`` gives back holds that were never used.
+Products with ``stock=None`` are unlimited and never touched. Staff add
+units with ``restock()``; ``Product.save()`` never writes ``stock``.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .api_cache import invalidate_for_model
+from .models import Cart, Product, StockReservation
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, "STOCK_RESERVATION_MINUTES", 15))
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(
+            "Not enough stock left for product(s) "
+            + ", ".join(map(str, self.product_ids))
+        )
+
+
+def _per_product(lines):
+    return Case(
+        *[When(pk=product_id, then=Value(n)) for product_id, n in lines.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _in_stock_changed():
+    transaction.on_commit(lambda: invalidate_for_model(Product))
+
+
+def take_stock(lines):
+    """
+    Take ``{product_id: quantity}`` off limited stock in one UPDATE, all or
+    nothing. ``lines`` must only hold products with a stock count. Raises
+    OutOfStock, after which the caller's transaction must be rolled back.
+    """
+    lines = {product_id: n for product_id, n in lines.items() if n > 0}
+    if not lines:
+        return
+    wanted = _per_product(lines)
+    updated = Product.objects.filter(pk__in=lines, stock__gte=wanted).update(
+        stock=F("stock") - wanted,
+        is_stock=Case(When(stock__gt=wanted, then=Value(True)), default=Value(False)),
+        updated_at=Case(When(stock__gt=wanted, then=F("updated_at")), default=Now()),
+    )
+    if updated != len(lines):
+        short = Product.objects.filter(
+            Q(stock__lt=_per_product(lines)) | Q(stock__isnull=True), pk__in=lines
+        )
+        raise OutOfStock(short.values_list("pk", flat=True))
+    if Product.objects.filter(pk__in=lines, stock=0).exists():
+        _in_stock_changed()
+
+
+def put_stock(lines):
+    """Give ``{product_id: quantity}`` back to limited stock in one UPDATE"""
+    lines = {product_id: n for product_id, n in lines.items() if n > 0}
+    if not lines:
+        return
+    returned = _per_product(lines)
+    limited = Product.objects.filter(pk__in=lines, stock__isnull=False)
+    if limited.filter(stock=0).exists():
+        _in_stock_changed()
+    limited.update(
+        stock=F("stock") + returned,
+        is_stock=Value(True),
+        updated_at=Case(When(stock=0, then=Now()), default=F("updated_at")),
+    )
+
+
+def restock(lines):
+    """
+    Add ``{product_id: quantity}`` to stock, the way staff change it (admin
+    form, API). Unlimited products start counting from zero.
+    """
+    lines = {product_id: n for product_id, n in lines.items() if n > 0}
+    with transaction.atomic():
+        Product.objects.filter(pk__in=lines, stock__isnull=True).update(stock=0)
+        put_stock(lines)
+
+
+def limited_lines(cart):
+    """``{product_id: quantity}`` of the cart's lines that have limited stock"""
+    rows = cart.items.filter(product__stock__isnull=False, quantity__gt=0)
+    return dict(rows.values_list("product_id", "quantity"))
+
+
+def reserve_cart(cart, ttl=None):
+    """
+    Hold stock for every limited line of ``cart`` until now + ``ttl``,
+    replacing earlier holds of the cart. Raises OutOfStock (and holds
+    nothing) if any line cannot be covered.
+    """
+    expires_at = timezone.now() + (ttl or reservation_ttl())
+    with transaction.atomic():
+        # Serializes concurrent holds for the same cart
+        Cart.objects.select_for_update().only("id").get(pk=cart.pk)
+        held = dict(
+            StockReservation.objects.select_for_update()
+            .filter(cart=cart)
+            .values_list("product_id", "quantity")
+        )
+        lines = limited_lines(cart)
+        adjust_stock(held, lines)
+        StockReservation.objects.filter(cart=cart).delete()
+        StockReservation.objects.bulk_create(
+            StockReservation(
+                cart=cart, product_id=product_id, quantity=n, expires_at=expires_at
+            )
+            for product_id, n in lines.items()
+        )
+
+
+def adjust_stock(held, wanted):
+    """Move from ``held`` units to ``wanted`` units, two UPDATEs at most"""
+    delta = Counter(wanted)
+    delta.subtract(held)
+    take_stock({product_id: n for product_id, n in delta.items() if n > 0})
+    put_stock({product_id: -n for product_id, n in delta.items() if n < 0})
+
+
+def consume_reservations(cart, lines):
+    """
+    Settle the stock for ordering ``lines`` (``{product_id: quantity}`` of
+    limited products) from ``cart``: keep its holds, even expired ones that
+    have not been swept yet, and take or return the difference.
+    """
+    reservations = StockReservation.objects.select_for_update().filter(cart=cart)
+    held = dict(reservations.values_list("product_id", "quantity"))
+    adjust_stock(held, lines)
+    if held:
+        reservations.delete()
+
+
+def release_expired_reservations(batch_size=500, now=None):
+    """Return the stock of expired holds, returns the number released"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by("pk")
+                .values_list("pk", "product_id", "quantity")[:batch_size]
+            )
+            if not batch:
+                return released
+            returned = Counter()
+            for _, product_id, quantity in batch:
+                returned[product_id] += quantity
+            put_stock(returned)
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+            released += len(batch)
@@ -1,3 +1,1964 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+
+from .api_cache import api_cache_stats, invalidate_api_cache
+from .cart import add_to_cart, parse_cart_lines
+from .category_tree import get_category_tree
+from .checkout import EmptyCart, place_order
+from .export import export_lines
+from .facets import facet_counts
+from .forms import ProductFilterForm
+from .fragments import fragment_cache
+from .models import (
+    Cart,
+    CartItem,
+    Category,
+    CategorySalesDaily,
+    Comment,
+    Contact,
+    Customer,
+    File,
+    Order,
+    OrderItem,
+    Product,
+    ProductSalesDaily,
+    StockReservation,
+)
+from .pagination import KeysetPaginator
+from .renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from .search import SEARCH_ORDERING, search_products
+from .stock import (
+    OutOfStock,
+    put_stock,
+    release_expired_reservations,
+    reserve_cart,
+    restock,
+    take_stock,
+)
+
+
+def make_products(count, categories=(), **extra):
+    """Create ``count`` enabled products attached to ``categories``"""
+    products = Product.objects.bulk_create(
+        Product(
+            title=f"Product {i}",
+            price=100 + i,
+            avatar="files/avatar/product.png",
+            **extra,
+        )
+        for i in range(count)
+    )
+    for product in products:
+        product.categories.set(categories)
+    return products
+
+
+def make_customer(email="buyer@example.com", phone="09120000000"):
+    user = CustomUser.objects.create_user(email, phone, password="secret-pass")
+    # The Customer row is created along with the user
+    customer = user.customer
+    customer.first_name, customer.last_name = "Buyer", "Test"
+    customer.save(update_fields=["first_name", "last_name"])
+    return customer
+
+
+class CatalogQuerySetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.phones = Category.objects.create(title="Phones")
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        self.client.get(url)  # warm the category tree cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_disabled_products_are_hidden(self):
+        make_products(2, [self.laptops])
+        Product.objects.create(title="Hidden", price=1, is_enable=False)
+        titles = set(Product.objects.catalog().values_list("title", flat=True))
+        self.assertNotIn("Hidden", titles)
+        self.assertEqual(len(titles), 2)
+
+    def test_listing_query_count_is_constant(self):
+        for name in ("home_page", "shop_page"):
+            with self.subTest(page=name):
+                Product.objects.all().delete()
+                make_products(2, [self.laptops, self.phones])
+                few = self.count_queries(reverse(name))
+                make_products(20, [self.laptops, self.phones])
+                many = self.count_queries(reverse(name))
+                self.assertEqual(few, many)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_products(7)
+        # Force ties on created_at so the id tie-breaker is exercised
+        Product.objects.filter(pk__in=Product.objects.order_by("pk")[:4]).update(
+            created_at=Product.objects.earliest("created_at").created_at
+        )
+        cls.expected = list(
+            Product.objects.order_by("-created_at", "-id").values_list("pk", flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Product.objects.all(), 3)
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append([p.pk for p in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sum(pages, []), self.expected)
+
+        back = paginator.page(page.previous_cursor)
+        self.assertEqual([p.pk for p in back], pages[-2])
+
+    def test_api_returns_cursor_links(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 7)
+        self.assertIsNone(response.data["next"])
+
+    def test_disabled_products_stay_writable(self):
+        product = Product.objects.order_by("pk").first()
+        admin = make_customer().user
+        admin.is_staff = True
+        admin.save()
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(admin)}"
+        )
+        url = f"/api/products/{product.pk}/"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                url, {"is_enable": False}, content_type="application/json"
+            )
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                url, {"is_enable": True}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        Product.objects.filter(pk=product.pk).update(is_enable=False)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get("/products/?cursor=bogus").status_code, 404)
+        self.assertEqual(
+            self.client.get("/api/products/?cursor=bogus").status_code, 404
+        )
+
+    def test_tampered_cursor_is_404(self):
+        def cursor(*values):
+            raw = json.dumps([0, list(values)]).encode()
+            return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+        tampered = [
+            f"cursor={cursor(None, 1)}",
+            f"cursor={cursor('2024-01-01T00:00:00+00:00', None)}",
+            f"cursor={cursor('later', 1)}",
+            f"q=product&cursor={cursor('high', 1)}",
+            f"q=product&cursor={cursor(None, 1)}",
+            f"sort=price&cursor={cursor({'amount': 1}, 1)}",
+            f"sort=price&cursor={cursor([1], 1)}",
+        ]
+        for query in tampered:
+            for path in ("/products/", "/api/products/"):
+                with self.subTest(path=path, query=query):
+                    response = self.client.get(f"{path}?{query}")
+                    self.assertEqual(response.status_code, 404)
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(title="Phone", price=100)
+        cls.alice = make_customer("alice@example.com", "09120000001")
+        cls.bob = make_customer("bob@example.com", "09120000002")
+
+    def assertRating(self, avg, count, **buckets):
+        self.product.refresh_from_db()
+        self.assertAlmostEqual(self.product.rating_avg, avg)
+        self.assertEqual(self.product.rating_count, count)
+        for name, value in buckets.items():
+            self.assertEqual(getattr(self.product, name), value)
+
+    def test_saves_do_not_write_back_stale_ratings(self):
+        loaded = Product.objects.get(pk=self.product.pk)
+        # Rated while the admin form (or an API request) had it loaded
+        Comment.objects.create(
+            product=self.product,
+            customer=self.alice,
+            text="ok",
+            stars=4,
+            is_approved=True,
+        )
+        loaded.price = 120
+        loaded.save()
+        self.assertRating(4, 1, rating_4=1)
+        self.assertEqual(self.product.price, 120)
+
+    def test_approve_unapprove_and_delete(self):
+        first = Comment.objects.create(
+            product=self.product, customer=self.alice, text="ok", stars=4
+        )
+        self.assertRating(0, 0)
+
+        first.is_approved = True
+        first.save()
+        Comment.objects.create(
+            product=self.product,
+            customer=self.bob,
+            text="great",
+            stars=5,
+            is_approved=True,
+        )
+        self.assertRating(4.5, 2, rating_4=1, rating_5=1)
+
+        first.stars = 2
+        first.save()
+        self.assertRating(3.5, 2, rating_2=1, rating_4=0)
+
+        first.is_approved = False
+        first.save()
+        self.assertRating(5, 1, rating_2=0, rating_5=1)
+
+        Comment.objects.filter(customer=self.bob).delete()
+        self.assertRating(0, 0, rating_5=0)
+
+    def test_rebuild_command(self):
+        Comment.objects.create(
+            product=self.product, customer=self.alice, text="a", stars=3
+        )
+        Comment.objects.create(
+            product=self.product, customer=self.bob, text="b", stars=1
+        )
+        # Bulk updates bypass signals, the rebuild brings the counters back
+        Comment.objects.update(is_approved=True)
+        self.assertRating(0, 0)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertRating(2, 2, rating_1=1, rating_3=1)
+
+
+class CategoryTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(title="Electronics")
+        cls.phones = Category.objects.create(title="Phones", parent=cls.electronics)
+        cls.android = Category.objects.create(title="Android", parent=cls.phones)
+        cls.books = Category.objects.create(title="Books")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.android.depth, 2)
+        self.assertTrue(self.android.path.startswith(self.electronics.path))
+
+        self.phones.parent = self.books
+        self.phones.save()
+        self.android.refresh_from_db()
+        self.assertTrue(self.android.path.startswith(self.books.path))
+        self.assertEqual(self.android.depth, 2)
+        self.assertEqual(set(self.electronics.get_descendants()), {self.electronics})
+
+    def test_cannot_move_below_itself(self):
+        self.electronics.parent = self.android
+        with self.assertRaises(ValueError):
+            self.electronics.save()
+
+    def test_subtree_products_in_one_query(self):
+        phone, book = make_products(2)
+        phone.categories.set([self.android, self.phones])
+        book.categories.set([self.books])
+        with self.assertNumQueries(1):
+            found = list(Product.objects.in_category(self.electronics))
+        self.assertEqual(found, [phone])
+
+    def test_nav_tree_is_cached_and_invalidated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title="Toys")
+        self.client.get(reverse("categories_page"))
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+        self.assertEqual(
+            [node["title"] for node in tree], ["Electronics", "Books", "Toys"]
+        )
+        self.assertEqual(tree[0]["children"][0]["children"][0]["title"], "Android")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books.is_enable = False
+            self.books.save()
+        response = self.client.get(reverse("categories_page"))
+        self.assertNotContains(response, ">Books<")
+        self.assertContains(response, ">Android<")
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cameras = Category.objects.create(title="Cameras")
+        cls.canon = Product.objects.create(
+            title="Canon EOS", price=900, description="Mirrorless body"
+        )
+        cls.tripod = Product.objects.create(
+            title="Tripod", price=50, description="Fits any Canon camera"
+        )
+        cls.mug = Product.objects.create(title="Mug", price=5)
+        cls.mug.categories.add(cls.cameras)
+
+    def search(self, query):
+        return list(
+            search_products(Product.objects.all(), query).order_by(*SEARCH_ORDERING)
+        )
+
+    def test_title_matches_rank_above_description(self):
+        self.assertEqual(self.search("canon"), [self.canon, self.tripod])
+
+    def test_category_titles_and_sync_on_save(self):
+        self.assertEqual(self.search("cameras"), [self.mug])
+        self.mug.categories.clear()
+        self.assertEqual(self.search("cameras"), [])
+
+        self.cameras.product_set.add(self.tripod)
+        self.tripod.title = "Travel stand"
+        self.tripod.save()
+        self.assertEqual(self.search("travel cameras"), [self.tripod])
+
+    def test_hostile_query_and_empty_query(self):
+        self.assertEqual(self.search('canon"* (^'), [self.canon, self.tripod])
+        self.assertEqual(self.search("!!!"), [])
+
+    @skipUnless(connection.vendor == "postgresql", "ts_rank is PostgreSQL only")
+    def test_keyset_pages_over_tied_ranks(self):
+        # Equal and distinct ranks, the float4 rank must not lose page bounds
+        Product.objects.bulk_create(
+            Product(title=f"Lens {'lens ' * (i % 3)}{i}", price=i) for i in range(11)
+        )
+        queryset = search_products(Product.objects.all(), "lens")
+        expected = list(
+            queryset.order_by(*SEARCH_ORDERING).values_list("pk", flat=True)
+        )
+        paginator = KeysetPaginator(queryset, 3, ordering=SEARCH_ORDERING)
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages += [p.pk for p in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(pages, expected)
+        self.assertEqual(len(pages), 11)
+
+    def test_store_page_and_api(self):
+        response = self.client.get(reverse("shop_page"), {"q": "canon"})
+        self.assertEqual(list(response.context["products"]), [self.canon, self.tripod])
+        response = self.client.get("/api/products/", {"q": "mirrorless"})
+        self.assertEqual([p["id"] for p in response.data["results"]], [self.canon.pk])
+
+
+class FacetedFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(title="Electronics")
+        cls.phones = Category.objects.create(title="Phones", parent=cls.electronics)
+        cls.books = Category.objects.create(title="Books")
+        cls.phone = Product.objects.create(title="Phone", price=500, is_off=True)
+        cls.phone.categories.set([cls.phones, cls.electronics])
+        cls.novel = Product.objects.create(title="Novel", price=20, is_stock=False)
+        cls.novel.categories.set([cls.books])
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, response):
+        return {product["id"] for product in response.data["results"]}
+
+    def test_api_filters(self):
+        url = "/api/products/"
+        self.assertEqual(
+            self.ids(self.client.get(url, {"min_price": 100})), {self.phone.pk}
+        )
+        self.assertEqual(
+            self.ids(self.client.get(url, {"is_off": "true"})), {self.phone.pk}
+        )
+        self.assertEqual(
+            self.ids(self.client.get(url, {"category": self.electronics.pk})),
+            {self.phone.pk},
+        )
+        self.assertEqual(
+            self.ids(
+                self.client.get(url, {"category": [self.books.pk, self.phones.pk]})
+            ),
+            {self.phone.pk, self.novel.pk},
+        )
+        self.assertEqual(self.client.get(url, {"min_price": "cheap"}).status_code, 400)
+
+    def test_facet_counts_in_one_query(self):
+        get_category_tree()
+        with self.assertNumQueries(1):
+            facets = facet_counts(Product.objects.catalog())
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["price"], {"min": 20, "max": 500})
+        self.assertEqual(facets["flags"], {"is_off": 1, "is_new": 2, "is_stock": 1})
+        counts = {facet["title"]: facet["count"] for facet in facets["categories"]}
+        # The phone sits in Electronics twice over but counts once
+        self.assertEqual(counts, {"Electronics": 1, "Books": 1})
+
+    def test_facets_count_each_group_without_its_own_filter(self):
+        response = self.client.get(
+            "/api/products/facets/", {"category": self.books.pk, "is_stock": "true"}
+        )
+        self.assertEqual(response.data["total"], 0)
+        counts = {f["title"]: f["count"] for f in response.data["categories"]}
+        # Electronics stays selectable next to Books, in-stock still applies
+        self.assertEqual(counts, {"Electronics": 1, "Books": 0})
+        # The in-stock count ignores the in-stock filter itself
+        response = self.client.get(
+            "/api/products/facets/", {"category": self.books.pk, "is_new": "true"}
+        )
+        self.assertEqual(
+            response.data["flags"], {"is_off": 0, "is_new": 1, "is_stock": 0}
+        )
+
+        response = self.client.get(
+            reverse("shop_page"), {"category": self.books.pk, "min_price": 100}
+        )
+        facets = response.context["facets"]
+        counts = {f["title"]: f["count"] for f in facets["categories"]}
+        self.assertEqual(counts, {"Electronics": 1, "Books": 0})
+        # The price range spans the Books selection, ignoring the price filter
+        self.assertEqual(facets["price"], {"min": 20, "max": 20})
+
+    def test_store_page_facets_follow_filters(self):
+        response = self.client.get(reverse("shop_page"), {"max_price": 100})
+        self.assertEqual(list(response.context["products"]), [self.novel])
+        self.assertEqual(response.context["facets"]["flags"]["is_stock"], 0)
+
+
+class ProductCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        (cls.product,) = make_products(1, [cls.laptops])
+
+    def setUp(self):
+        cache.clear()
+        fragment_cache().clear()
+
+    def store_page(self):
+        return self.client.get(reverse("shop_page")).content.decode()
+
+    def test_cards_are_served_from_cache(self):
+        self.store_page()
+        # Writing behind the ORM's back proves the cached HTML is reused
+        Product.objects.filter(pk=self.product.pk).update(title="Renamed")
+        self.assertIn("Product 0", self.store_page())
+
+    def test_product_save_invalidates(self):
+        self.store_page()
+        self.product.refresh_from_db()
+        self.product.title = "Renamed"
+        self.product.save()
+        self.assertIn("Renamed", self.store_page())
+
+    def test_category_rename_and_membership_invalidate(self):
+        self.store_page()
+        self.laptops.title = "Notebooks"
+        self.laptops.save()
+        self.assertIn("Notebooks", self.store_page())
+
+        tablets = Category.objects.create(title="Tablets")
+        self.product.categories.add(tablets)
+        self.assertIn("Tablets", self.store_page())
+
+    def test_csrf_token_is_not_cached(self):
+        token = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+        first = token.findall(self.store_page())
+        second = token.findall(
+            self.client_class().get(reverse("shop_page")).content.decode()
+        )
+        self.assertTrue(first)
+        self.assertNotEqual(first, second)
+
+
+class DiscountPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sale = Product.objects.create(
+            title="Sale", price=100, is_off=True, sale_price=60
+        )
+        cls.percent = Product.objects.create(
+            title="Percent", price=200, is_off=True, discount_percent=25
+        )
+        cls.inactive = Product.objects.create(
+            title="Inactive", price=80, is_off=False, sale_price=10
+        )
+
+    def test_effective_price_is_stored(self):
+        prices = dict(Product.objects.values_list("title", "effective_price"))
+        self.assertEqual(prices, {"Sale": 60, "Percent": 150, "Inactive": 80})
+        self.percent.refresh_from_db()
+        self.assertEqual(self.percent.discount_label(), 25)
+
+    def test_sale_price_must_be_below_price(self):
+        product = Product(title="Bad", price=10, sale_price=10, is_off=True)
+        with self.assertRaises(ValidationError):
+            product.full_clean()
+
+    def test_discount_rules_hold_on_every_write_path(self):
+        product = Product(title="Both", price=10, sale_price=5, discount_percent=10)
+        with self.assertRaises(ValidationError) as caught:
+            product.full_clean()
+        self.assertEqual(list(caught.exception.message_dict), ["discount_percent"])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.sale.pk).update(sale_price=100)
+
+        admin = make_customer().user
+        admin.is_staff = True
+        admin.save()
+        response = self.client.patch(
+            "/api/products/bulk/",
+            [
+                {"id": self.sale.pk, "discount_percent": 10},
+                {"id": self.percent.pk, "sale_price": 250, "discount_percent": None},
+                {"id": self.inactive.pk, "price": 5},
+                {"id": self.percent.pk, "discount_percent": 30},
+            ],
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(admin)}",
+        )
+        self.assertEqual(response.data["updated"], [self.percent.pk])
+        self.assertEqual(
+            [list(e["errors"]) for e in response.data["errors"]],
+            [["discount_percent"], ["sale_price"], ["sale_price"]],
+        )
+
+    def test_sort_and_filter_by_effective_price(self):
+        paginator = KeysetPaginator(
+            Product.objects.all(), 2, ProductFilterForm.SORT_ORDERINGS["price"]
+        )
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(
+            list(first) + list(second), [self.sale, self.inactive, self.percent]
+        )
+
+        response = self.client.get(
+            "/api/products/", {"sort": "-price", "max_price": 100}
+        )
+        self.assertEqual(
+            [p["id"] for p in response.data["results"]],
+            [self.inactive.pk, self.sale.pk],
+        )
+
+
+class HotPathIndexTests(TestCase):
+    """EXPLAIN the lookups behind the busiest pages and check they hit an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.product = make_products(1)[0]
+        cls.cart = Cart.objects.create(customer=cls.customer)
+
+    def assertUsesIndex(self, queryset, name=None):
+        if connection.vendor == "postgresql":
+            # Tiny test tables are cheaper to scan, ask for the indexed plan
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn("index", plan.lower(), plan)
+        if name is not None:
+            self.assertIn(name, plan)
+
+    def test_approved_comments_of_product(self):
+        self.assertUsesIndex(
+            Comment.objects.filter(product=self.product, is_approved=True).order_by(
+                "-created_at"
+            ),
+            "comment_approved_idx",
+        )
+
+    def test_existing_comment_check(self):
+        self.assertUsesIndex(
+            Comment.objects.filter(customer=self.customer, product=self.product)
+        )
+
+    def test_cart_line_lookup(self):
+        self.assertUsesIndex(
+            CartItem.objects.filter(cart=self.cart, product=self.product)
+        )
+
+    def test_active_cart_lookup(self):
+        self.assertUsesIndex(
+            Cart.objects.filter(customer=self.customer, is_active=True),
+            "cart_one_active_per_customer",
+        )
+
+    def test_catalog_listing(self):
+        self.assertUsesIndex(
+            Product.objects.enabled().order_by("-created_at", "-id")[:20],
+            "product_catalog_idx",
+        )
+
+    def test_duplicate_rows_are_rejected(self):
+        Comment.objects.create(customer=self.customer, product=self.product, text="a")
+        CartItem.objects.create(cart=self.cart, product=self.product)
+        for create in (
+            lambda: Comment.objects.create(
+                customer=self.customer, product=self.product, text="b"
+            ),
+            lambda: CartItem.objects.create(cart=self.cart, product=self.product),
+            lambda: Cart.objects.create(customer=self.customer),
+        ):
+            with self.subTest(create=create), self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    create()
+        # Closed carts do not count against the one-open-cart rule
+        Cart.objects.create(customer=self.customer, is_active=False)
+
+
+class BulkAddToCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.products = make_products(50)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer.user)
+
+    def post(self, product_ids, quantities=None):
+        if quantities is None:
+            quantities = [1] * len(product_ids)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse("add_multiple_to_cart"),
+                {"product_ids": product_ids, "quantities": quantities},
+            )
+        self.assertRedirects(
+            response, reverse("cart_page"), fetch_redirect_response=False
+        )
+        return len(ctx.captured_queries)
+
+    def quantities(self):
+        return dict(CartItem.objects.values_list("product_id", "quantity"))
+
+    def test_query_count_does_not_grow_with_items(self):
+        ids = [p.pk for p in self.products]
+        self.post(ids[:1])  # open the cart
+        CartItem.objects.all().delete()
+        few = self.post(ids[:2])
+        CartItem.objects.all().delete()
+        many = self.post(ids)
+        self.assertEqual(few, many)
+        self.assertEqual(self.quantities(), dict.fromkeys(ids, 1))
+
+    def test_existing_lines_are_incremented(self):
+        first, second = self.products[0].pk, self.products[1].pk
+        self.post([first], [2])
+        self.post([first, second, first], [3, 1, 1])
+        self.assertEqual(self.quantities(), {first: 6, second: 1})
+        self.assertEqual(Cart.objects.filter(is_active=True).count(), 1)
+
+    def test_unknown_ids_are_reported_not_fatal(self):
+        hidden = make_products(1, is_enable=False)[0]
+        self.post([self.products[0].pk, 999999, hidden.pk, "abc"])
+        self.assertEqual(self.quantities(), {self.products[0].pk: 1})
+
+        cart = Cart.objects.get()
+        added, unknown = add_to_cart(cart, {999999: 1, hidden.pk: 1})
+        self.assertEqual((added, sorted(unknown)), ({}, sorted([999999, hidden.pk])))
+
+    def test_parse_cart_lines(self):
+        self.assertEqual(
+            parse_cart_lines(["1", "x", "1", "2"], ["2", "1", "0", "y"]),
+            ({1: 3, 2: 1}, ["x"]),
+        )
+
+
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.cart = Cart.objects.create(customer=cls.customer)
+        cls.full = Product.objects.create(title="Full", price=100)
+        cls.sale = Product.objects.create(
+            title="Sale", price=100, is_off=True, sale_price=60
+        )
+        CartItem.objects.create(cart=cls.cart, product=cls.full, quantity=2)
+        CartItem.objects.create(cart=cls.cart, product=cls.sale, quantity=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer.user)
+
+    def test_totals_are_summed_in_sql(self):
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_price(), 380)
+            self.assertEqual(cart.item_count, 5)
+        # Without the annotation it is still one query, not one per item
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cart.get_total_price(), 380)
+        lines = dict(
+            self.cart.items.with_line_total().values_list("product_id", "line_total")
+        )
+        self.assertEqual(lines, {self.full.pk: 200, self.sale.pk: 180})
+
+        order = Order.objects.create(customer=self.customer, address="Street")
+        OrderItem.objects.create(order=order, product=self.sale, quantity=2)
+        self.assertEqual(Order.objects.with_totals().get().get_total_price(), 120)
+        self.assertEqual(
+            Cart.objects.with_totals().get(pk=self.cart.pk).total_price, 380
+        )
+
+    def test_cart_page_query_count_is_constant(self):
+        url = reverse("cart_page")
+        self.client.get(url)  # warm the category tree cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, "$380")
+        few = len(ctx.captured_queries)
+
+        for product in make_products(20):
+            CartItem.objects.create(cart=self.cart, product=product)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), few)
+
+    def test_checkout_and_api_show_totals(self):
+        response = self.client.get(reverse("checkout_page"))
+        self.assertContains(response, "3x Sale")
+        self.assertContains(response, "$380")
+
+        response = self.client.get(f"/api/carts/{self.cart.pk}/")
+        self.assertEqual(response.data["total_price"], 380)
+
+
+class SessionCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.products = make_products(3)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, *pairs):
+        return self.client.post(
+            reverse("add_multiple_to_cart"),
+            {
+                "product_ids": [product.pk for product, _ in pairs],
+                "quantities": [quantity for _, quantity in pairs],
+            },
+        )
+
+    def test_anonymous_cart_writes_no_cart_rows(self):
+        first, second, third = self.products
+        self.add((first, 2), (second, 1))
+        self.add((first, 1))
+        self.client.post(reverse("update_cart_item", args=[second.pk]), {"quantity": 0})
+
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.client.session["cart"], {str(first.pk): 3})
+        response = self.client.get(reverse("cart_page"))
+        self.assertContains(response, f"${first.price * 3}")
+
+        response = self.client.post(
+            reverse("update_cart_item", args=[third.pk]), {"quantity": 1}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_session_cart_is_merged_at_login(self):
+        first, second, _ = self.products
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, product=first, quantity=1)
+        self.add((first, 2), (second, 4))
+
+        response = self.client.post(
+            reverse("login_page"),
+            {"email": self.customer.email, "password": "secret-pass"},
+        )
+        self.assertRedirects(
+            response, reverse("home_page"), fetch_redirect_response=False
+        )
+        self.assertNotIn("cart", self.client.session)
+        self.assertEqual(
+            dict(cart.items.values_list("product_id", "quantity")),
+            {first.pk: 3, second.pk: 4},
+        )
+        # Carries on as the account cart
+        self.add((second, 1))
+        self.assertEqual(cart.items.get(product=second).quantity, 5)
+
+
+class RequestCustomerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_customer_is_created_with_user(self):
+        user = CustomUser.objects.create_user("new@example.com", "09121111111")
+        self.assertEqual(user.customer.email, "new@example.com")
+        self.assertEqual(user.customer.phone, "09121111111")
+
+    def test_customer_and_cart_resolve_once_per_session(self):
+        customer = make_customer()
+        self.client.force_login(customer.user)
+        url = reverse("cart_page")
+        self.client.get(url)  # caches the customer id, opens the cart
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        tables = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse([sql for sql in tables if '"products_customer"' in sql])
+        self.assertEqual(
+            len([sql for sql in tables if 'FROM "products_cart"' in sql]), 1
+        )
+        self.assertEqual(
+            self.client.session["_customer"], [customer.user.pk, customer.pk]
+        )
+
+    def test_review_uses_request_customer(self):
+        customer = make_customer()
+        product = make_products(1)[0]
+        self.client.force_login(customer.user)
+        self.client.post(
+            reverse("product_review", args=[product.pk]), {"text": "Nice", "stars": 4}
+        )
+        self.assertEqual(Comment.objects.get().customer, customer)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.products = make_products(100)
+
+    def setUp(self):
+        cache.clear()
+
+    def fill_cart(self, size):
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=2)
+            for product in self.products[:size]
+        )
+        return cart
+
+    def test_order_snapshots_prices_and_closes_cart(self):
+        cart = self.fill_cart(2)
+        order, created = place_order(self.customer.pk, "Street 1")
+        self.assertTrue(created)
+        self.assertEqual(
+            list(order.items.order_by("id").values_list("product_id", "price")),
+            [(self.products[0].pk, 100), (self.products[1].pk, 101)],
+        )
+        cart.refresh_from_db()
+        self.assertFalse(cart.is_active)
+
+        Product.objects.filter(pk=self.products[0].pk).update(price=999)
+        self.assertEqual(Order.objects.with_totals().get().get_total_price(), 402)
+        with self.assertRaises(EmptyCart):
+            place_order(self.customer.pk, "Street 1")
+
+    def test_idempotency_key(self):
+        self.fill_cart(3)
+        first, created = place_order(self.customer.pk, "Street", idempotency_key="k1")
+        self.fill_cart(1)
+        again, created_again = place_order(
+            self.customer.pk, "Street", idempotency_key="k1"
+        )
+        self.assertEqual((first, created, created_again), (again, True, False))
+        self.assertEqual(Order.objects.count(), 1)
+        # The second cart is still open for a new checkout
+        self.assertTrue(Cart.objects.filter(is_active=True).exists())
+
+    def test_query_count_is_bounded(self):
+        counts = []
+        for size in (1, 10, 100):
+            self.fill_cart(size)
+            with CaptureQueriesContext(connection) as ctx:
+                place_order(self.customer.pk, "Street", idempotency_key=str(size))
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertEqual(OrderItem.objects.count(), 111)
+
+    def test_checkout_form_places_one_order(self):
+        self.fill_cart(2)
+        self.client.force_login(self.customer.user)
+        response = self.client.get(reverse("checkout_page"))
+        key = response.context["form"].initial["checkout_key"]
+        data = {
+            "first_name": "Buyer",
+            "last_name": "Test",
+            "email": self.customer.email,
+            "address": "Street 1",
+            "city": "Tehran",
+            "country": "Iran",
+            "zip_code": "12345",
+            "telephone": "09120000000",
+            "checkout_key": key,
+        }
+        for _ in range(2):
+            response = self.client.post(reverse("checkout_page"), data)
+            self.assertRedirects(
+                response, reverse("home_page"), fetch_redirect_response=False
+            )
+        order = Order.objects.get()
+        self.assertEqual(order.address, "Street 1, Tehran, Iran, 12345")
+        self.assertEqual(order.get_total_price(), 402)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_checkout", "--sizes", "1", "5", "--repeat", "2", stdout=out
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class StockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.limited = Product.objects.create(title="Limited", price=10, stock=5)
+        cls.unlimited = Product.objects.create(title="Unlimited", price=10)
+
+    def setUp(self):
+        self.cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=self.cart, product=self.limited, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.unlimited, quantity=9)
+
+    def stock(self):
+        return Product.objects.values_list("stock", "is_stock").get(pk=self.limited.pk)
+
+    def test_conditional_decrement_is_all_or_nothing(self):
+        other = Product.objects.create(title="Other", price=1, stock=1)
+        with self.assertRaises(OutOfStock) as caught:
+            with transaction.atomic():
+                take_stock({self.limited.pk: 2, other.pk: 2})
+        self.assertEqual(caught.exception.product_ids, [other.pk])
+        self.assertEqual(self.stock(), (5, True))
+
+        take_stock({self.limited.pk: 5})
+        self.assertEqual(self.stock(), (0, False))
+
+    def test_running_out_invalidates_api_cache(self):
+        cache.clear()
+        url = f"/api/products/{self.limited.pk}/"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            take_stock({self.limited.pk: 1})
+        # Only the count moved, the cached response may lag
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            take_stock({self.limited.pk: 4})
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertFalse(response.data["is_stock"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            put_stock({self.limited.pk: 2})
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertTrue(response.data["is_stock"])
+
+    def test_saves_do_not_write_back_stale_stock(self):
+        loaded = Product.objects.get(pk=self.limited.pk)
+        # Sold out while the admin form (or an API request) had it loaded
+        take_stock({self.limited.pk: 5})
+        loaded.title = "Renamed"
+        loaded.save()
+        self.assertEqual(self.stock(), (0, False))
+
+        staff = make_customer("staff@example.com", "09121111111").user
+        staff.is_staff = True
+        staff.save()
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(staff)}"
+        )
+        url = f"/api/products/{self.limited.pk}/"
+        response = self.client.patch(
+            url, {"title": "Again", "stock": 99}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), (0, False))
+
+        response = self.client.post(
+            f"{url}restock/", {"quantity": 4}, content_type="application/json"
+        )
+        self.assertEqual(
+            response.data, {"id": self.limited.pk, "stock": 4, "is_stock": True}
+        )
+        self.assertEqual(
+            self.client.post(f"{url}restock/", {"quantity": 0}).status_code, 400
+        )
+        restock({self.unlimited.pk: 2})
+        self.assertEqual(Product.objects.get(pk=self.unlimited.pk).stock, 2)
+
+    def test_admin_restocks_instead_of_editing_stock(self):
+        admin = CustomUser.objects.create_superuser(
+            "admin@example.com", "09129999999", "pw"
+        )
+        self.client.force_login(admin)
+        url = reverse("admin:products_product_change", args=[self.limited.pk])
+        self.assertNotContains(self.client.get(url), 'name="stock"')
+        take_stock({self.limited.pk: 1})  # while the form is open
+        response = self.client.post(
+            url,
+            {
+                "title": "Limited",
+                "price": 10,
+                "stock": 50,
+                "restock": 3,
+                "is_enable": "on",
+                "stars": 0,
+                "images-TOTAL_FORMS": 0,
+                "images-INITIAL_FORMS": 0,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(), (7, True))
+
+    def test_only_an_explicit_post_holds_stock(self):
+        self.client.force_login(self.customer.user)
+        for _ in range(2):
+            # Reloads, prefetches and crawlers neither hold nor extend
+            self.assertEqual(self.client.get(reverse("checkout_page")).status_code, 200)
+        self.assertEqual(self.stock(), (5, True))
+        self.assertFalse(StockReservation.objects.exists())
+
+        self.assertEqual(self.client.get(reverse("checkout_hold")).status_code, 405)
+        response = self.client.post(reverse("checkout_hold"))
+        self.assertRedirects(
+            response, reverse("checkout_page"), fetch_redirect_response=False
+        )
+        self.assertEqual(self.stock(), (2, True))
+        expires_at = StockReservation.objects.get().expires_at
+        self.client.get(reverse("checkout_page"))
+        self.assertEqual(StockReservation.objects.get().expires_at, expires_at)
+
+        Product.objects.filter(pk=self.limited.pk).update(stock=0)
+        StockReservation.objects.all().delete()
+        response = self.client.post(reverse("checkout_hold"))
+        self.assertRedirects(
+            response, reverse("cart_page"), fetch_redirect_response=False
+        )
+
+    def test_reservation_is_kept_by_the_order(self):
+        reserve_cart(self.cart)
+        self.assertEqual(self.stock(), (2, True))
+        reserve_cart(self.cart)  # refreshing a hold does not take twice
+        self.assertEqual(self.stock(), (2, True))
+
+        self.cart.items.filter(product=self.limited).update(quantity=4)
+        place_order(self.customer.pk, "Street")
+        self.assertEqual(self.stock(), (1, True))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        reserve_cart(self.cart, ttl=timedelta(minutes=-1))
+        self.assertEqual(self.stock(), (2, True))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.stock(), (5, True))
+        self.assertEqual(release_expired_reservations(), 0)
+
+    def test_checkout_fails_without_stock(self):
+        Product.objects.filter(pk=self.limited.pk).update(stock=2)
+        with self.assertRaises(OutOfStock):
+            place_order(self.customer.pk, "Street")
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.get(pk=self.cart.pk).is_active)
+
+
+class StockContentionTests(TransactionTestCase):
+    def test_hot_product_is_never_oversold(self):
+        out = StringIO()
+        call_command(
+            "stress_stock",
+            "--threads=6",
+            "--attempts=10",
+            "--stock=25",
+            stdout=out,
+        )
+        self.assertIn("consistent", out.getvalue())
+
+
+class StaleCartCleanupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = [
+            make_customer(f"buyer{i}@example.com", f"0912000000{i}") for i in range(4)
+        ]
+        cls.product = make_products(1)[0]
+
+    def make_cart(self, customer, days_old, is_active=True):
+        cart = Cart.objects.create(customer=customer, is_active=is_active)
+        CartItem.objects.create(cart=cart, product=self.product)
+        Cart.objects.filter(pk=cart.pk).update(
+            updated_at=timezone.now() - timedelta(days=days_old)
+        )
+        return cart
+
+    def test_purges_stale_carts_in_batches(self):
+        fresh = self.make_cart(self.customers[0], 1)
+        self.make_cart(self.customers[1], 40)
+        self.make_cart(self.customers[2], 40, is_active=False)
+        recent_order = self.make_cart(self.customers[2], 2, is_active=False)
+        self.make_cart(self.customers[3], 90)
+
+        out = StringIO()
+        call_command("purge_stale_carts", "--dry-run", "--batch-size=2", stdout=out)
+        self.assertIn("Would delete 3 carts and 3 items in 3 batches", out.getvalue())
+        self.assertEqual(Cart.objects.count(), 5)
+
+        call_command("purge_stale_carts", "--batch-size=2", stdout=out)
+        self.assertIn("Deleted 3 carts and 3 items", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(
+            set(Cart.objects.values_list("pk", flat=True)), {fresh.pk, recent_order.pk}
+        )
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_cart_activity_keeps_it_fresh(self):
+        cart = self.make_cart(self.customers[0], 40)
+        add_to_cart(cart, {self.product.pk: 1})
+        call_command("purge_stale_carts", stdout=StringIO())
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(title="Books")
+        cls.music = Category.objects.create(title="Music")
+        cls.customers = [
+            make_customer(f"buyer{i}@example.com", f"0912000000{i}") for i in range(2)
+        ]
+        cls.novel, cls.album = make_products(2)
+        cls.novel.categories.set([cls.books])
+        cls.album.categories.set([cls.books, cls.music])
+
+    def order(self, customer, *lines):
+        cart = Cart.objects.create(customer=customer)
+        for product, quantity in lines:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return place_order(customer.pk, "Street")[0]
+
+    def rollups(self):
+        return (
+            set(
+                ProductSalesDaily.objects.values_list(
+                    "date", "product", "units", "revenue", "orders"
+                )
+            ),
+            set(
+                CategorySalesDaily.objects.values_list(
+                    "date", "category", "units", "revenue", "orders"
+                )
+            ),
+        )
+
+    def test_orders_update_rollups_incrementally(self):
+        first = self.order(self.customers[0], (self.novel, 2), (self.album, 1))
+        self.order(self.customers[1], (self.album, 3))
+        day = first.date
+        products, categories = self.rollups()
+        self.assertEqual(
+            products,
+            {(day, self.novel.pk, 2, 200, 1), (day, self.album.pk, 4, 404, 2)},
+        )
+        self.assertEqual(
+            categories,
+            {(day, self.books.pk, 6, 604, 2), (day, self.music.pk, 4, 404, 2)},
+        )
+
+        # A rebuild from the order history lands on the same numbers
+        ProductSalesDaily.objects.update(units=0)
+        CategorySalesDaily.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_sales_rollups", "--chunk-days=1", stdout=out)
+        self.assertIn("Wrote 4 sales rollup rows", out.getvalue())
+        self.assertEqual(self.rollups(), (products, categories))
+
+    def test_read_api_and_admin(self):
+        order = self.order(self.customers[0], (self.novel, 2), (self.album, 1))
+        staff = self.customers[0].user
+        staff.is_staff = staff.is_superuser = True
+        staff.save()
+        self.client.force_login(staff)
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(staff)}"
+        )
+
+        day = order.date.isoformat()
+        response = self.client.get("/api/sales/products/", {"start": day, "end": day})
+        self.assertEqual(
+            {row["product_title"]: row["units"] for row in response.data["results"]},
+            {self.novel.title: 2, self.album.title: 1},
+        )
+        response = self.client.get("/api/sales/categories/top/")
+        self.assertEqual(
+            [(row["title"], row["revenue"]) for row in response.data],
+            [("Books", 301), ("Music", 101)],
+        )
+        self.assertEqual(
+            self.client.get("/api/sales/products/", {"start": "bad"}).status_code, 400
+        )
+        self.assertEqual(
+            self.client.get("/admin/products/productsalesdaily/").status_code, 200
+        )
+
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(self.customers[1].user)}"
+        )
+        self.assertEqual(self.client.get("/api/sales/products/").status_code, 403)
+
+
+class CartBadgeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.first, cls.second = make_products(2)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, quantity):
+        self.client.post(
+            reverse("add_multiple_to_cart"),
+            {"product_ids": [product.pk], "quantities": [quantity]},
+        )
+
+    def cart_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home_page"))
+        return response, [
+            q["sql"] for q in ctx.captured_queries if "products_cart" in q["sql"]
+        ]
+
+    def test_badge_is_cached_and_invalidated_by_cart_views(self):
+        self.client.force_login(self.customer.user)
+        response, queries = self.cart_queries()
+        self.assertContains(response, "0 Item(s) selected")
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(Cart.objects.exists())  # reading does not create a cart
+
+        self.add(self.first, 2)
+        self.add(self.second, 1)
+        response, queries = self.cart_queries()
+        self.assertContains(response, "3 Item(s) selected")
+        self.assertContains(response, f"SUBTOTAL: ${2 * 100 + 101}")
+        response, queries = self.cart_queries()
+        self.assertContains(response, "3 Item(s) selected")
+        self.assertEqual(queries, [])
+
+        item = CartItem.objects.get(product=self.first)
+        self.client.post(reverse("update_cart_item", args=[item.pk]), {"quantity": 0})
+        response, _ = self.cart_queries()
+        self.assertContains(response, "1 Item(s) selected")
+        self.assertContains(response, "SUBTOTAL: $101")
+
+    def test_anonymous_badge_follows_the_session_cart_through_login(self):
+        response, queries = self.cart_queries()
+        self.assertContains(response, "0 Item(s) selected")
+        self.assertEqual(queries, [])
+
+        self.add(self.first, 2)
+        self.assertContains(self.client.get(reverse("home_page")), "2 Item(s) selected")
+
+        # The account's empty badge is cached from another device
+        other = self.client_class()
+        other.force_login(self.customer.user)
+        self.assertContains(other.get(reverse("home_page")), "0 Item(s) selected")
+        self.client.post(
+            reverse("login_page"),
+            {"email": self.customer.email, "password": "secret-pass"},
+        )
+        self.assertContains(self.client.get(reverse("home_page")), "2 Item(s) selected")
+
+
+class QueryBudgetTests(TestCase):
+    """Every API list endpoint runs a fixed number of queries"""
+
+    # JWT user lookup + rows (+ one per prefetched relation, + the ETag
+    # aggregate on products and categories)
+    BUDGET = {
+        "/api/products/": 4,
+        "/api/files/": 2,
+        "/api/categories/": 3,
+        "/api/carts/": 3,
+        "/api/customers/": 2,
+        "/api/orders/": 3,
+        "/api/comments/": 2,
+        "/api/contacts/": 2,
+        "/api/sales/products/": 2,
+        "/api/sales/categories/": 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_customer().user
+        cls.admin.is_staff = cls.admin.is_superuser = True
+        cls.admin.save()
+        cls.rows = 0
+
+    def setUp(self):
+        cache.clear()
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(self.admin)}"
+        )
+
+    def populate(self, count):
+        """Grow every endpoint to ``count`` rows"""
+        start, self.rows = self.rows, count
+        new = range(start, count)
+        categories = Category.objects.bulk_create(
+            Category(title=f"Category {i}") for i in new
+        )
+        products = make_products(len(new))
+        Product.categories.through.objects.bulk_create(
+            Product.categories.through(product=product, category=category)
+            for product, category in zip(products, categories)
+        )
+        File.objects.bulk_create(
+            File(title=f"File {i}", product=product, file="files/manual.pdf")
+            for i, product in zip(new, products)
+        )
+        users = CustomUser.objects.bulk_create(
+            CustomUser(email=f"bulk{i}@example.com", phone_number=f"0935{i:07d}")
+            for i in new
+        )
+        customers = Customer.objects.bulk_create(
+            Customer(user=user, first_name="Bulk", email=user.email) for user in users
+        )
+        carts = Cart.objects.bulk_create(
+            Cart(customer=customer) for customer in customers
+        )
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=2)
+            for cart, product in zip(carts, products)
+        )
+        orders = Order.objects.bulk_create(
+            Order(customer=customer, address="Street") for customer in customers
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order, product in zip(orders, products)
+        )
+        Comment.objects.bulk_create(
+            Comment(product=product, customer=customer, text="Fine", stars=4)
+            for product, customer in zip(products, customers)
+        )
+        Contact.objects.bulk_create(
+            Contact(fullname="Visitor", email="v@example.com", message="Hi")
+            for _ in new
+        )
+        today = timezone.localdate()
+        ProductSalesDaily.objects.bulk_create(
+            ProductSalesDaily(date=today, product=product, units=1, revenue=1, orders=1)
+            for product in products
+        )
+        CategorySalesDaily.objects.bulk_create(
+            CategorySalesDaily(
+                date=today, category=category, units=1, revenue=1, orders=1
+            )
+            for category in categories
+        )
+
+    def query_counts(self):
+        cache.clear()  # budgets are for response cache misses
+        counts = {}
+        for url in self.BUDGET:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.populate(10)
+        self.assertEqual(self.query_counts(), self.BUDGET)
+        self.populate(1000)
+        self.assertEqual(self.query_counts(), self.BUDGET)
+
+    def test_nested_lines_are_priced(self):
+        self.populate(10)
+        cart = self.client.get("/api/carts/").data[0]
+        self.assertEqual(len(cart["items"]), 1)
+        self.assertEqual(cart["items"][0]["line_total"], cart["total_price"])
+        order = self.client.get("/api/orders/").data[0]
+        self.assertEqual(order["items"][0]["line_total"], order["items"][0]["price"])
+
+
+class FieldSelectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.products = make_products(3, [cls.laptops], description="Long text")
+        File.objects.create(
+            title="Manual", product=cls.products[0], file="files/manual.pdf"
+        )
+        cls.customer = make_customer()
+        cart = Cart.objects.create(customer=cls.customer)
+        CartItem.objects.create(cart=cart, product=cls.products[0], quantity=2)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, [q["sql"] for q in ctx.captured_queries]
+
+    def test_fields_trim_objects_and_columns(self):
+        response, queries = self.get("/api/products/", {"fields": "id,title"})
+        self.assertEqual(
+            response.data["results"][0],
+            {"id": self.products[2].pk, "title": "Product 2"},
+        )
+        # ETag aggregate and products: no categories prefetch, and
+        # descriptions are not read
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[1])
+
+        response, queries = self.get(
+            f"/api/products/{self.products[0].pk}/",
+            {"fields": "title,rating_histogram"},
+        )
+        self.assertEqual(set(response.data), {"title", "rating_histogram"})
+        self.assertEqual(len(queries), 2)
+
+        response, queries = self.get("/api/carts/", {"fields": "id,total_price"})
+        self.assertEqual(response.data[0]["total_price"], 200)
+        self.assertEqual(len(queries), 1)
+
+    def test_expand_nests_related_objects(self):
+        response, queries = self.get(
+            "/api/products/", {"fields": "title", "expand": "categories,images"}
+        )
+        first = response.data["results"][-1]
+        self.assertEqual(first["categories"][0]["title"], "Laptops")
+        self.assertEqual(first["images"][0]["title"], "Manual")
+        self.assertEqual(len(queries), 6)  # three of them ETag aggregates
+
+        response, queries = self.get("/api/files/", {"expand": "product"})
+        self.assertEqual(response.data[0]["product"]["categories"], ["Laptops"])
+        self.assertEqual(len(queries), 2)
+
+        response, _ = self.get("/api/carts/", {"expand": "customer"})
+        self.assertEqual(response.data[0]["customer"]["first_name"], "Buyer")
+        self.assertEqual(len(response.data[0]["items"]), 1)
+
+    def test_unknown_names_are_rejected(self):
+        response, _ = self.get("/api/products/", {"fields": "title,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fields", response.data)
+        response, _ = self.get("/api/comments/", {"expand": "text"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expand", response.data)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.products = make_products(3, [cls.laptops], stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response["ETag"],
+                HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+            )
+        return again, len(ctx.captured_queries)
+
+    def test_api_answers_304_until_the_catalog_changes(self):
+        product = self.products[0]
+        for url in (
+            "/api/products/",
+            f"/api/products/{product.pk}/",
+            "/api/categories/",
+            f"/api/categories/{self.laptops.pk}/",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # From the response cache's stored validators, then from the
+            # ETag aggregate
+            again, queries = self.revalidate(url, response)
+            self.assertEqual((again.status_code, queries), (304, 0), url)
+            cache.clear()
+            again, queries = self.revalidate(url, response)
+            self.assertEqual((again.status_code, queries), (304, 1), url)
+
+        url = "/api/products/"
+        response = self.client.get(url)
+        other = self.client.get(url, {"fields": "id"})
+        self.assertNotEqual(other["ETag"], response["ETag"])
+        # Selling stock does not bump updated_at but still changes the ETag
+        # (the response cache lets stock counts lag, see products.api_cache)
+        Product.objects.filter(pk=product.pk).update(stock=4)
+        invalidate_api_cache("products")
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+        url = "/api/categories/"
+        response = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptops.delete()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_pages_revalidate_per_visitor(self):
+        product = self.products[0]
+        for url in (
+            reverse("shop_page"),
+            reverse("Product_detail", args=[product.pk]),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+
+        url = reverse("Product_detail", args=[product.pk])
+        response = self.client.get(url)
+        self.client.post(
+            reverse("add_multiple_to_cart"),
+            {"product_ids": [product.pk], "quantities": [1]},
+        )
+        # The header's cart badge changed, and a flash message is pending
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+
+        product.title = "Renamed"
+        product.save()
+        self.assertContains(self.revalidate(url, response)[0], "Renamed")
+
+    def test_pages_revalidate_per_csrf_token(self):
+        url = reverse("shop_page")
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+        # Logging in rotates the token, the anonymous page's forms are stale
+        self.client.force_login(make_customer().user)
+        self.client.logout()
+        again = self.revalidate(url, response)[0]
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], response["ETag"])
+
+
+class ApiResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.products = make_products(3, [cls.laptops])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, len(ctx.captured_queries)
+
+    def test_hits_are_served_without_queries(self):
+        response, _ = self.get("/api/products/", {"sort": "price", "max_price": 500})
+        self.assertEqual(response["X-Cache"], "MISS")
+        # Same parameters in another order
+        again, queries = self.get("/api/products/?max_price=500&sort=price")
+        self.assertEqual((again["X-Cache"], queries), ("HIT", 0))
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(again["ETag"], response["ETag"])
+
+        self.assertEqual(
+            self.get("/api/products/", {"sort": "-price"})[0]["X-Cache"], "MISS"
+        )
+        self.assertEqual(self.get("/api/categories/")[0]["X-Cache"], "MISS")
+        self.assertEqual(self.get("/api/categories/")[0]["X-Cache"], "HIT")
+
+        # Writes and errors are never cached
+        self.assertEqual(
+            self.get("/api/products/", {"fields": "nope"})[0].status_code, 400
+        )
+        self.assertNotIn("X-Cache", self.get("/api/products/", {"fields": "nope"})[0])
+
+    def test_signals_invalidate_dependent_resources(self):
+        product = self.products[0]
+        url = f"/api/products/{product.pk}/"
+        self.get(url)
+        self.get("/api/categories/")
+        self.get("/api/files/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.title = "Renamed"
+            product.save()
+        response, _ = self.get(url)
+        self.assertEqual(
+            (response["X-Cache"], response.data["title"]), ("MISS", "Renamed")
+        )
+        self.assertEqual(self.get("/api/categories/")[0]["X-Cache"], "HIT")
+        self.assertEqual(self.get("/api/files/")[0]["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptops.title = "Notebooks"
+            self.laptops.save()
+        response, _ = self.get(url)
+        self.assertEqual(response.data["categories"], ["Notebooks"])
+        self.assertEqual(self.get("/api/categories/")[0]["X-Cache"], "MISS")
+
+        # Ratings change with an UPDATE, the comment signal invalidates
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                product=product,
+                customer=make_customer(),
+                text="Great",
+                stars=5,
+                is_approved=True,
+            )
+        self.assertEqual(self.get(url)[0].data["rating_count"], 1)
+
+    def test_browsable_api_is_not_cached(self):
+        for _ in range(2):
+            response = self.client_class().get(
+                "/api/products/", HTTP_ACCEPT="text/html"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Cache", response)
+            # Every visitor gets a page with their own token
+            self.assertIn("csrftoken", response.cookies)
+        self.assertEqual(api_cache_stats()["products"]["misses"], 0)
+
+    @override_settings(API_CACHE_TIMEOUTS={"products": 5})
+    def test_stats_are_exposed_to_admins(self):
+        self.get("/api/products/")
+        self.get("/api/products/")
+        self.get("/api/categories/")
+        admin = make_customer().user
+        admin.is_staff = True
+        admin.save()
+
+        self.assertEqual(self.get("/api/cache-stats/")[0].status_code, 401)
+        response = self.client.get(
+            "/api/cache-stats/",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(admin)}",
+        )
+        self.assertEqual(
+            response.data["products"],
+            {"hits": 1, "misses": 1, "hit_ratio": 0.5, "timeout": 5},
+        )
+        self.assertEqual(response.data["categories"]["misses"], 1)
+        self.assertEqual(response.data["categories"]["timeout"], 3600)
+
+
+class BulkWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.admin = make_customer().user
+        cls.admin.is_staff = True
+        cls.admin.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(self.admin)}"
+        )
+
+    def send(self, method, url, rows):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(
+                url, rows, content_type="application/json"
+            )
+
+    def test_create_reports_invalid_rows(self):
+        rows = [{"title": f"Bulk {i}", "price": 10 + i} for i in range(3)]
+        rows.insert(1, {"title": "No price"})
+        rows.append("not an object")
+        response = self.send("post", "/api/products/bulk/", rows)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["created"]), 3)
+        self.assertEqual(
+            [(e["index"], list(e["errors"])) for e in response.data["errors"]],
+            [(1, ["price"]), (4, ["non_field_errors"])],
+        )
+        self.assertEqual(
+            sorted(Product.objects.values_list("price", flat=True)), [10, 11, 12]
+        )
+        self.assertEqual(self.send("post", "/api/products/bulk/", {}).status_code, 400)
+        self.assertEqual(
+            self.send("post", "/api/products/bulk/", [{}]).status_code, 400
+        )
+
+    def test_requires_admin(self):
+        customer = make_customer("other@example.com", "09121111111").user
+        self.client.defaults["HTTP_AUTHORIZATION"] = (
+            f"Bearer {AccessToken.for_user(customer)}"
+        )
+        response = self.send("post", "/api/products/bulk/", [{"title": "x"}])
+        self.assertEqual(response.status_code, 403)
+        del self.client.defaults["HTTP_AUTHORIZATION"]
+        response = self.send("delete", "/api/categories/bulk/", [self.laptops.pk])
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(Category.objects.filter(pk=self.laptops.pk).exists())
+
+    @override_settings(BULK_BATCH_SIZE=250)
+    def test_queries_do_not_grow_with_rows(self):
+        rows = [{"title": f"Bulk {i}", "price": i} for i in range(1000)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.send("post", "/api/products/bulk/", rows)
+        self.assertEqual(len(response.data["created"]), 1000)
+        self.assertLess(len(ctx.captured_queries), 30)
+
+        updates = [{"id": pk, "price": 5} for pk in response.data["created"]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.send("patch", "/api/products/bulk/", updates)
+        self.assertEqual(len(response.data["updated"]), 1000)
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(Product.objects.filter(price=5).count(), 1000)
+
+    def test_categories_get_their_path(self):
+        response = self.send(
+            "post",
+            "/api/categories/bulk/",
+            [{"title": "Gaming", "parent": self.laptops.pk}, {"title": "Phones"}],
+        )
+        gaming, phones = Category.objects.in_bulk(response.data["created"]).values()
+        self.assertEqual(gaming.path, gaming.build_path(self.laptops.path)[0])
+        self.assertTrue(gaming.path.startswith(self.laptops.path))
+        self.assertEqual((gaming.depth, phones.depth), (1, 0))
+        self.assertIn("Gaming", str(get_category_tree()))
+
+    def test_update_writes_only_sent_fields(self):
+        product, other = make_products(2, [self.laptops])
+        Product.objects.filter(pk=product.pk).update(stock=7)
+        response = self.send(
+            "patch",
+            "/api/products/bulk/",
+            [
+                {"id": product.pk, "price": 1},
+                {"id": other.pk, "title": "Renamed"},
+                {"id": product.pk, "price": 2},
+                {"id": 0, "price": 3},
+                {"id": other.pk, "price": -1, "is_new": "maybe"},
+            ],
+        )
+        self.assertEqual(sorted(response.data["updated"]), [product.pk, other.pk])
+        self.assertEqual(
+            [(e["index"], e["id"]) for e in response.data["errors"]],
+            [(2, product.pk), (3, 0), (4, other.pk)],
+        )
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(
+            (product.price, product.stock, product.title), (1, 7, "Product 0")
+        )
+        self.assertEqual((other.title, other.price), ("Renamed", 101))
+        self.assertGreater(product.updated_at, other.created_at)
+
+    def test_delete_reports_unknown_ids_and_invalidates_cache(self):
+        products = make_products(3)
+        self.client.get("/api/products/")
+        self.assertEqual(self.client.get("/api/products/")["X-Cache"], "HIT")
+
+        response = self.send(
+            "delete", "/api/products/bulk/", [products[0].pk, products[1].pk, 0, "x"]
+        )
+        self.assertEqual(response.data["deleted"], [products[0].pk, products[1].pk])
+        self.assertEqual([e["index"] for e in response.data["errors"]], [2, 3])
+        listing = self.client.get("/api/products/")
+        self.assertEqual(listing["X-Cache"], "MISS")
+        self.assertEqual(len(listing.data["results"]), 1)
+
+
+class StreamingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        laptops = Category.objects.create(title="Laptops")
+        gaming = Category.objects.create(title="Gaming")
+        cls.products = make_products(5, [laptops, gaming])
+        cls.products[0].categories.set([laptops])
+        cls.customer = make_customer()
+        cls.customer.user.is_staff = True
+        cls.customer.user.save()
+        Comment.objects.create(
+            product=cls.products[0], customer=cls.customer, text='Said "hi",\nok'
+        )
+        cart = Cart.objects.create(customer=cls.customer)
+        CartItem.objects.create(cart=cart, product=cls.products[1], quantity=3)
+        cls.order, _ = place_order(cls.customer.pk, "Street 1")
+
+    def export(self, url, **headers):
+        return self.client.get(
+            url,
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.customer.user)}",
+            **headers,
+        )
+
+    def test_ndjson_stream(self):
+        response = self.export("/api/export/products.ndjson")
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        self.assertIn('filename="products-', response["Content-Disposition"])
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [p.pk for p in self.products])
+        self.assertEqual(rows[0]["categories"], "Laptops")
+        self.assertEqual(rows[1]["categories"], "Gaming|Laptops")
+        self.assertEqual(rows[1]["price"], 101)
+
+        orders = self.export("/api/export/orders/", HTTP_ACCEPT="application/x-ndjson")
+        (order,) = map(json.loads, b"".join(orders.streaming_content).splitlines())
+        self.assertEqual(
+            (order["id"], order["item_count"], order["total_price"]),
+            (self.order.pk, 3, 303),
+        )
+
+    def test_csv_stream(self):
+        response = self.export("/api/export/comments.csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        content = b"".join(response.streaming_content).decode()
+        (row,) = csv.DictReader(StringIO(content))
+        self.assertEqual(row["text"], 'Said "hi",\nok')
+        self.assertEqual(row["product_title"], "Product 0")
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get("/api/export/products.csv").status_code, 401)
+        self.assertEqual(self.export("/api/export/nope.csv").status_code, 404)
+
+    def test_chunks_keep_queries_per_chunk_constant(self):
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(export_lines("products", "csv", chunk_size=2))
+        # Header, then three chunks of at most two rows
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(sum(chunk.count("\n") for chunk in chunks), 6)
+        # The row cursor plus one category query per chunk
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_command_writes_file(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / "orders.csv"
+            call_command(
+                "export_data",
+                "orders",
+                format="csv",
+                output=str(path),
+                stdout=StringIO(),
+            )
+            rows = list(csv.DictReader(path.open(newline="")))
+        self.assertEqual(rows[0]["customer_email"], self.customer.email)
+
+        out = StringIO()
+        call_command("export_data", "products", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+
+class RendererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.laptops = Category.objects.create(title="Laptops")
+        cls.products = make_products(3, [cls.laptops], description="Déjà vu\u2028")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fast_json_matches_drf_json(self):
+        data = self.client.get("/api/products/").data
+        data["extra"] = {
+            1: gettext_lazy("Price"),
+            "total": Decimal("1.50"),
+            "at": timezone.now().replace(microsecond=123456),
+            "naive": timezone.now().replace(tzinfo=None),
+            "day": timezone.localdate(),
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_api_negotiates_json(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        pretty = self.client.get(
+            "/api/products/", HTTP_ACCEPT="application/json; indent=2"
+        )
+        self.assertIn(b'\n  "', pretty.content)
+        self.assertEqual(
+            self.client.get(
+                "/api/products/", HTTP_ACCEPT="application/xml"
+            ).status_code,
+            406,
+        )
+
+    def test_fast_json_parser(self):
+        admin = make_customer().user
+        admin.is_staff = True
+        admin.save()
+        auth = f"Bearer {AccessToken.for_user(admin)}"
+        response = self.client.patch(
+            "/api/products/bulk/",
+            '[{"id": %d, "title": "Caf\u00e9"}]' % self.products[0].pk,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=auth,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).title, "Café")
+        response = self.client.patch(
+            "/api/products/bulk/",
+            "[{",
+            content_type="application/json",
+            HTTP_AUTHORIZATION=auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.data["detail"])
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        response = self.client.get("/api/products/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.content),
+            msgpack.unpackb(MessagePackRenderer().render(response.data)),
+        )
+        self.assertEqual(len(msgpack.unpackb(response.content)["results"]), 3)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_renderers", products=20, repeat=2, stdout=out)
+        self.assertIn("orjson", out.getvalue())
+        self.assertFalse(Product.objects.filter(title__startswith="Benchmark").exists())
@@ -13,12 +13,27 @@ router.register("customers", views.CustomerViewSet, basename="customer-viewset")
 router.register("orders", views.OrderViewSet, basename="order-viewset")
 router.register("comments", views.CommentViewSet, basename="comment-viewset")
 router.register("contacts", views.ContactViewSet, basename="contact-viewset")
+router.register(
+    "sales/products", views.ProductSalesViewSet, basename="product-sales-viewset"
+)
+router.register(
+    "sales/categories", views.CategorySalesViewSet, basename="category-sales-viewset"
+)
+router.register("cache-stats", views.ApiCacheStatsViewSet, basename="cache-stats")
+router.register("export", views.ExportViewSet, basename="export")
 
 
 urlpatterns = [
     path("", views.home_page, name="home_page"),
     path("checkout/", views.CheckoutFormView.as_view(), name="checkout_page"),
+    path("checkout/hold/", views.hold_checkout_stock, name="checkout_hold"),
     path("products/", views.ProductListView.as_view(), name="shop_page"),
+    path("categories/", views.categories_page, name="categories_page"),
+    path(
+        "category/<int:pk>/",
+        views.CategoryProductListView.as_view(),
+        name="Category_detail",
+    ),
     path("product/<int:pk>/review/", views.review_model_view, name="product_review"),
     path("product/<int:pk>/", views.ProductDetailView.as_view(), name="Product_detail"),
     path('add_to_cart/',views.add_multiple_to_cart,name="add_multiple_to_cart"),
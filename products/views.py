@@ -1,15 +1,27 @@
+import uuid
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.views import generic
 from django.contrib import messages
-from django.contrib.auth import authenticate
-from django.db.models import Avg
-from django.contrib.auth.decorators import login_required
-from django.db import transaction
+from django.contrib.auth import authenticate, login
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 
 
 from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    IsAdminUser,
+    IsAuthenticatedOrReadOnly,
+)
 
 from .models import (
     Category,
@@ -22,8 +34,53 @@ from .models import (
     Customer,
     Order,
     OrderItem,
+    CategorySalesDaily,
+    ProductSalesDaily,
+)
+from .api_cache import (
+    api_cache_stats,
+    cache_response,
+    get_cached_response,
+    is_cacheable_renderer,
+)
+from .bulk import bulk_create, bulk_delete, bulk_update
+from .cart import parse_cart_lines
+from .cart_badge import invalidate_cart_badge
+from .checkout import EmptyCart, place_order
+from .conditional import (
+    catalog_condition,
+    category_list_state,
+    combine_states,
+    product_list_state,
+    product_state,
+    table_state,
+)
+from .customers import get_customer_id
+from .export import EXPORT_RENDERERS, EXPORTS, export_lines
+from .facets import facet_counts
+from .fieldsets import (
+    EXPAND_PARAM,
+    FIELDS_PARAM,
+    narrow_queryset,
+    parse_field_selection,
+)
+from .forms import (
+    CheckoutForm,
+    CommentForm,
+    LoginForm,
+    ProductFilterForm,
+    SalesFilterForm,
+)
+from .pagination import (
+    DEFAULT_ORDERING,
+    InvalidCursor,
+    KeysetPagination,
+    KeysetPaginator,
+    get_keyset_ordering,
+    page_url,
 )
-from .forms import CheckoutForm, CommentForm, LoginForm
+from .search import SEARCH_ORDERING, search_products
+from .stock import OutOfStock, reserve_cart, restock
 from .serializers import (
     CartSerializer,
     CategorySerializer,
@@ -33,6 +90,9 @@ from .serializers import (
     CustomerSerializer,
     CommentSerializer,
     ContactSerializer,
+    CategorySalesDailySerializer,
+    ProductSalesDailySerializer,
+    RestockSerializer,
 )
 
 
@@ -41,7 +101,7 @@ from .serializers import (
 
 def home_page(request):
     """Render home page with all products and categories"""
-    products = Product.objects.all()
+    products = Product.objects.for_cards()
     categories = Category.objects.all()
     return render(
         request, "index.html", {"products": products, "categories": categories}
@@ -52,18 +112,123 @@ class HomeProductListView(generic.ListView):
     """ListView for displaying products on home page"""
 
     model = Product
+    queryset = Product.objects.for_cards()
     context_object_name = "product"
     template_name = "index.html"
 
 
-class ProductListView(generic.ListView):
+class ProductSearchMixin:
+    """Ranked ``?q=`` search shared by the store page and ProductViewSet"""
+
+    search_param = "q"
+
+    def get_search_query(self):
+        return self.request.GET.get(self.search_param, "").strip()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.get_search_query()
+        if query:
+            queryset = search_products(queryset, query)
+        return queryset
+
+    def get_keyset_ordering(self):
+        return SEARCH_ORDERING if self.get_search_query() else DEFAULT_ORDERING
+
+
+class ProductFilterMixin:
+    """Facet filters (price range, flags, categories) from the query string"""
+
+    def get_filter_form(self):
+        if not hasattr(self, "_filter_form"):
+            self._filter_form = ProductFilterForm(self.request.GET)
+            self._filter_form.is_valid()
+        return self._filter_form
+
+    def get_queryset(self):
+        return self.get_filter_form().filter_queryset(self.get_unfiltered_queryset())
+
+    def get_unfiltered_queryset(self):
+        """What the filters narrow, the base of the facet counts"""
+        return super().get_queryset()
+
+    def get_facet_counts(self, selected_categories=()):
+        return facet_counts(
+            self.get_unfiltered_queryset(),
+            self.get_filter_form().filter_conditions(),
+            selected_categories,
+        )
+
+    def get_keyset_ordering(self):
+        return self.get_filter_form().get_ordering() or super().get_keyset_ordering()
+
+
+def catalog_page_state(request, *args, **kwargs):
+    # Category changes show in the navigation menu of every page
+    return combine_states(product_list_state(), category_list_state())
+
+
+def product_page_state(request, pk, *args, **kwargs):
+    state = product_state(pk)
+    if state is None:
+        return None
+    return combine_states(state, category_list_state())
+
+
+@method_decorator(catalog_condition(catalog_page_state, per_visitor=True), name="get")
+class ProductListView(ProductFilterMixin, ProductSearchMixin, generic.ListView):
     """ListView for displaying all products in store page"""
 
     model = Product
+    queryset = Product.objects.for_cards()
     context_object_name = "products"
     template_name = "store.html"
+    paginate_by = 20
+
+    def paginate_queryset(self, queryset, page_size):
+        """Seek by keyset cursor instead of LIMIT/OFFSET + COUNT"""
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering())
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context["page_obj"]
+        context["next_url"] = page_url(self.request, page.next_cursor)
+        context["previous_url"] = page_url(self.request, page.previous_cursor)
+        context["search_query"] = self.get_search_query()
+        form = self.get_filter_form()
+        selected = {category.pk for category in form.cleaned_data.get("category", ())}
+        context["filter_form"] = form
+        context["facets"] = self.get_facet_counts(selected)
+        return context
+
+
+class CategoryProductListView(ProductListView):
+    """Store page restricted to a category and all of its subcategories"""
+
+    def get_unfiltered_queryset(self):
+        if not hasattr(self, "category"):
+            self.category = get_object_or_404(
+                Category.objects.enabled(), pk=self.kwargs["pk"]
+            )
+        return super().get_unfiltered_queryset().in_category(self.category)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["category"] = self.category
+        return context
+
 
+def categories_page(request):
+    """Render the full category tree"""
+    return render(request, "categories.html")
 
+
+@method_decorator(catalog_condition(product_page_state, per_visitor=True), name="get")
 class ProductDetailView(generic.DetailView):
     """DetailView for a single product"""
 
@@ -79,32 +244,66 @@ class CheckoutFormView(generic.FormView):
     form_class = CheckoutForm
     success_url = reverse_lazy("home_page")
 
+    def get_initial(self):
+        return {**super().get_initial(), "checkout_key": uuid.uuid4().hex}
+
+    def form_valid(self, form):
+        if not self.request.user.is_authenticated:
+            messages.error(self.request, "Please log in to place your order.")
+            return redirect("login_page")
+        try:
+            order, created = place_order(
+                get_customer_id(self.request),
+                address=form.get_address(),
+                phone=form.cleaned_data["telephone"][:11],
+                idempotency_key=form.cleaned_data["checkout_key"],
+            )
+        except (EmptyCart, OutOfStock) as exc:
+            messages.error(self.request, str(exc))
+            return redirect("cart_page")
+        invalidate_cart_badge(self.request)
+        if created:
+            messages.success(self.request, f"Order #{order.pk} has been placed.")
+        else:
+            messages.info(self.request, f"Order #{order.pk} was already placed.")
+        return super().form_valid(form)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["cart"] = self.request.cart
+        context["cart_items"] = self.request.cart.items()
+        return context
+
+
+@require_POST
+def hold_checkout_stock(request):
+    """
+    "Proceed to checkout": hold the cart's limited stock while the customer
+    fills in the checkout form. A POST of its own, so reloading (or
+    prefetching) the checkout page never takes stock or extends a hold.
+    """
+    if request.user.is_authenticated:
+        try:
+            reserve_cart(request.cart.cart)
+        except OutOfStock as exc:
+            messages.warning(request, str(exc))
+            return redirect("cart_page")
+    return redirect("checkout_page")
+
 
 # -------------- Add To cart View -------------------
 
 
-@login_required(login_url="/login/")
 def add_multiple_to_cart(request):
     """
-    Add multiple products to the user's shopping cart in a single transaction.
+    Add multiple products to the visitor's shopping cart in one bulk operation.
     Expects POST data in the format:
         product_ids: list of product IDs
         quantities: list of corresponding quantities
-    All additions are atomic: either all succeed or none.
+    Unknown or disabled products are reported and skipped, the rest are added.
+    Anonymous visitors get a session cart that is merged into their account
+    cart when they log in.
     """
-    user = request.user
-
-    # Ensure Customer object exists for the logged-in user
-    customer, _ = Customer.objects.get_or_create(
-        user=user,
-        defaults={
-            "first_name": getattr(user, "first_name", "FirstName"),
-            "last_name": getattr(user, "last_name", "LastName"),
-            "email": getattr(user, "email", "example@example.com"),
-            "phone": "00000000000",
-        },
-    )
-
     product_ids = request.POST.getlist("product_ids")
     quantities = request.POST.getlist("quantities")
 
@@ -112,28 +311,19 @@ def add_multiple_to_cart(request):
         messages.error(request, "Invalid product data submitted.")
         return redirect("cart_page")  # یا هر صفحه مناسب
 
-    try:
-        with transaction.atomic():
-            # Get or create cart
-            cart, _ = Cart.objects.get_or_create(customer=customer)
-
-            for prod_id, qty in zip(product_ids, quantities):
-                product = get_object_or_404(Product, pk=int(prod_id))
-                quantity = max(int(qty), 1)  # Ensure at least 1
-
-                # Get or create cart item
-                cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-                if created:
-                    cart_item.quantity = quantity
-                else:
-                    cart_item.quantity += quantity
-
-                cart_item.save()
-
-        messages.success(request, "All selected products have been added to your cart!")
-
-    except Exception as e:
-        messages.error(request, f"An error occurred while adding products: {str(e)}")
+    lines, invalid = parse_cart_lines(product_ids, quantities)
+    # A fixed number of queries however many products are submitted
+    added, unknown = request.cart.add(lines)
+    invalidate_cart_badge(request)
+
+    if added:
+        messages.success(request, f"Added {len(added)} product(s) to your cart.")
+    missing = [str(product_id) for product_id in unknown] + invalid
+    if missing:
+        messages.warning(
+            request,
+            f"These products could not be found and were skipped: {', '.join(missing)}",
+        )
 
     return redirect("cart_page")
 
@@ -141,40 +331,21 @@ def add_multiple_to_cart(request):
 # -------------- Cart Summary View ------------------
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Cart, CartItem, Customer, Product
 from django.db import transaction
 
-@login_required(login_url="/login/")
 def cart_summary_view(request):
     """
-    Display the user's shopping cart with all items, quantities, and total prices.
+    Display the visitor's shopping cart with all items, quantities, and total prices.
     Allows updating quantities or removing items via separate views.
     """
-    user = request.user
-
-    # Ensure a Customer exists for the user
-    customer, _ = Customer.objects.get_or_create(
-        user=user,
-        defaults={
-            "first_name": getattr(user, "first_name", "FirstName"),
-            "last_name": getattr(user, "last_name", "LastName"),
-            "email": getattr(user, "email", "example@example.com"),
-            "phone": "00000000000",  # Default value if not set
-        }
-    )
-
-    # Ensure the user's cart exists
-    cart, _ = Cart.objects.get_or_create(customer=customer)
-
-    # Calculate total price for the cart
-    total_price = sum(item.get_total_price() for item in cart.items.all())
+    cart = request.cart
 
     context = {
         "cart": cart,
-        "cart_items": cart.items.all(),  # Access CartItem objects in template
-        "total_price": total_price,
+        "cart_items": cart.items(),  # CartItem-like lines with line_total
+        "total_price": cart.get_total_price(),
     }
 
     return render(request, "cart_summary.html", context)
@@ -185,49 +356,29 @@ def cart_summary_view(request):
 
 
 from django.shortcuts import get_object_or_404, redirect
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import CartItem, Cart, Customer
 
-@login_required(login_url="/login/")
 def update_cart_item(request, item_id):
     """
-    Update quantity of a specific item in the user's cart.
+    Update quantity of a specific item in the visitor's cart.
     If quantity is set to 0, remove the item from the cart.
     """
-    user = request.user
-
-    # Ensure Customer exists
-    customer, _ = Customer.objects.get_or_create(
-        user=user,
-        defaults={
-            "first_name": getattr(user, "first_name", "FirstName"),
-            "last_name": getattr(user, "last_name", "LastName"),
-            "email": getattr(user, "email", "example@example.com"),
-            "phone": "00000000000",
-        },
-    )
-
-    # Ensure Cart exists
-    cart, _ = Cart.objects.get_or_create(customer=customer)
-
-    # Get the CartItem to update
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-
     if request.method == "POST":
         try:
-            quantity = int(request.POST.get("quantity", cart_item.quantity))
+            quantity = int(request.POST.get("quantity", ""))
         except ValueError:
             messages.error(request, "Invalid quantity entered.")
             return redirect("cart_page")
 
+        product = request.cart.set_quantity(item_id, quantity)
+        invalidate_cart_badge(request)
+        if product is None:
+            raise Http404("No such item in your cart.")
         if quantity <= 0:
-            cart_item.delete()
-            messages.success(request, f"Removed {cart_item.product.title} from your cart.")
+            messages.success(request, f"Removed {product.title} from your cart.")
         else:
-            cart_item.quantity = quantity
-            cart_item.save()
-            messages.success(request, f"Updated quantity for {cart_item.product.title}.")
+            messages.success(request, f"Updated quantity for {product.title}.")
 
     return redirect("cart_page")
 
@@ -258,16 +409,8 @@ def review_model_view(request, pk):
             messages.error(request, "You must be logged in to submit a comment.")
             return redirect("login_page")
 
-        # Ensure a Customer object exists for the logged-in user
-        customer, created = Customer.objects.get_or_create(
-            user=request.user,
-            defaults={
-                "first_name": getattr(request.user, "first_name", "FirstName"),
-                "last_name": getattr(request.user, "last_name", "LastName"),
-                "email": getattr(request.user, "email", "example@example.com"),
-                "phone": "00000000000",  # Default value
-            },
-        )
+        # Resolved once per request by CustomerCartMiddleware
+        customer = request.customer
 
         # Check if the user already commented on this product
         if Comment.objects.filter(customer=customer, product=product).exists():
@@ -276,13 +419,19 @@ def review_model_view(request, pk):
 
         # Save new comment if form is valid
         if form.is_valid():
-            Comment.objects.create(
-                product=product,
-                customer=customer,
-                text=form.cleaned_data["text"],
-                stars=form.cleaned_data["stars"],
-                is_approved=False,  # Set True if you want to auto-approve
-            )
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(
+                        product=product,
+                        customer=customer,
+                        text=form.cleaned_data["text"],
+                        stars=form.cleaned_data["stars"],
+                        is_approved=False,  # Set True if you want to auto-approve
+                    )
+            except IntegrityError:
+                # A concurrent submission won the comment_unique_customer race
+                messages.error(request, f"You have already commented on {product.title}.")
+                return redirect(product.get_absolute_url())
             messages.success(
                 request,
                 "Your comment has been registered and will be displayed after admin approval.",
@@ -293,8 +442,14 @@ def review_model_view(request, pk):
             messages.error(request, "There was a problem with your form submission.")
 
     # For GET request or invalid POST: display the form and approved comments
-    approved_comments = Comment.objects.filter(product=product, is_approved=True)
-    avg_stars = approved_comments.aggregate(Avg("stars"))["stars__avg"] or 0
+    # Served by the partial comment_approved_idx index
+    approved_comments = (
+        Comment.objects.filter(product=product, is_approved=True)
+        .select_related("customer")
+        .order_by("-created_at")
+    )
+    # Maintained incrementally by products.ratings, no per-request aggregate
+    avg_stars = product.rating_avg
 
     context = {
         "product": product,
@@ -322,6 +477,8 @@ def login_page(request):
         user = authenticate(request, username=username, password=password)
 
         if user:
+            # Fires user_logged_in, which merges the session cart
+            login(request, user)
             messages.success(request, f"Welcome back, {username}!")
             return redirect("home_page")
         else:
@@ -340,50 +497,332 @@ def signUp_page(request):
 
 # -------------- API Viewsets --------------
 
+# Querysets load everything their serializer reads up front, QueryBudgetTests
+# pins the query count of every list endpoint.
+
+
+class BulkWriteMixin:
+    """
+    ``/bulk/`` endpoint for catalog sync: POST a list of objects to create
+    them, PATCH a list of objects with ``id`` to update them, DELETE a list
+    of ids. Valid rows are written, invalid ones come back in ``errors``
+    with their index (see products.bulk).
+    """
+
+    @action(
+        detail=False,
+        methods=["post", "patch", "delete"],
+        permission_classes=[IsAdminUser],
+    )
+    def bulk(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({"non_field_errors": ["Expected a list."]})
+        context = self.get_serializer_context()
+        if request.method == "POST":
+            ids, errors = bulk_create(self.get_serializer_class(), rows, context)
+            key, status = "created", 201
+        elif request.method == "PATCH":
+            ids, errors = bulk_update(self.get_serializer_class(), rows, context)
+            key, status = "updated", 200
+        else:
+            ids, errors = bulk_delete(self.get_queryset().model, rows)
+            key, status = "deleted", 200
+        if errors and not ids:
+            status = 400
+        return Response({key: ids, "errors": errors}, status=status)
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache of ``list``/``retrieve`` responses under
+    ``cache_resource``, see products.api_cache
+    """
+
+    cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cached(self, handler, request, *args, **kwargs):
+        if not is_cacheable_renderer(request.accepted_renderer):
+            return handler(request, *args, **kwargs)
+        response = get_cached_response(self.cache_resource, request)
+        if response is None:
+            self._cache_miss = True
+            response = handler(request, *args, **kwargs)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_cache_miss", False) and response.status_code == 200:
+            cache_response(self.cache_resource, request, response)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified on ``list`` and ``retrieve``, from the state returned
+    by ``get_list_state()``/``get_object_state()`` (see products.conditional)
+    """
+
+    def get_list_state(self):
+        raise NotImplementedError
+
+    def get_object_state(self):
+        return self.get_list_state()
+
+    def list(self, request, *args, **kwargs):
+        handler = catalog_condition(lambda *args, **kwargs: self.get_list_state())
+        return handler(super().list)(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        handler = catalog_condition(lambda *args, **kwargs: self.get_object_state())
+        return handler(super().retrieve)(request, *args, **kwargs)
+
+
+class SparseFieldsMixin:
+    """``?fields=`` and ``?expand=`` for reads, see products.fieldsets"""
+
+    def get_field_selection(self):
+        if not hasattr(self, "_field_selection"):
+            self._field_selection = parse_field_selection(
+                self.get_serializer_class(), self.request.query_params
+            )
+        return self._field_selection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in SAFE_METHODS:
+            context[FIELDS_PARAM], context[EXPAND_PARAM] = self.get_field_selection()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        fields, expand = self.get_field_selection()
+        if fields is None and not expand:
+            return queryset
+        ordering = get_keyset_ordering(self, ())
+        return narrow_queryset(
+            queryset,
+            self.get_serializer_class(),
+            fields,
+            expand,
+            keep=[name.lstrip("-") for name in ordering],
+        )
 
-class CartViewSet(viewsets.ModelViewSet):
-    queryset = Cart.objects.all()
+
+class CartViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Cart.objects.with_totals().with_items()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+class OrderViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.with_totals().with_items()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class ContactViewSet(viewsets.ModelViewSet):
+class ContactViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Contact.objects.all()
     serializer_class = ContactSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class FileViewSet(viewsets.ModelViewSet):
+class FileViewSet(
+    BulkWriteMixin, CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     queryset = File.objects.all()
     serializer_class = FileSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-
-
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    cache_resource = "files"
+
+
+class ProductViewSet(
+    BulkWriteMixin,
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    ProductFilterMixin,
+    ProductSearchMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Product.objects.catalog()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    cache_resource = "products"
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return super().get_queryset()
+        # Writes reach disabled products too, so they can be re-enabled
+        return Product.objects.all()
+
+    def get_filter_form(self):
+        form = super().get_filter_form()
+        if form.errors:
+            raise ValidationError(form.errors)
+        return form
+
+    def expanded_states(self):
+        _, expand = self.get_field_selection()
+        states = []
+        if "categories" in expand:
+            states.append(category_list_state())
+        if "images" in expand:
+            states.append(table_state(File.objects.all()))
+        return states
+
+    def get_list_state(self):
+        return combine_states(product_list_state(), *self.expanded_states())
+
+    def get_object_state(self):
+        state = product_state(self.kwargs["pk"])
+        if state is None:
+            return None
+        return combine_states(state, *self.expanded_states())
+
+    @action(detail=True, methods=["post"], permission_classes=[IsAdminUser])
+    def restock(self, request, pk=None):
+        """Add ``quantity`` units to the product's stock"""
+        product = self.get_object()
+        serializer = RestockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        restock({product.pk: serializer.validated_data["quantity"]})
+        product.refresh_from_db(fields=["stock", "is_stock"])
+        return Response(
+            {"id": product.pk, "stock": product.stock, "is_stock": product.is_stock}
+        )
 
+    @action(detail=False)
+    def facets(self, request):
+        """Facet counts for the current search and filters"""
+        return Response(self.get_facet_counts())
 
-class CategoryViewSet(viewsets.ModelViewSet):
+
+class CategoryViewSet(
+    BulkWriteMixin,
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cache_resource = "categories"
+
+    def get_list_state(self):
+        # A handful of rows, details use the whole table too (parents expand)
+        return category_list_state()
+
+
+class ApiCacheStatsViewSet(viewsets.ViewSet):
+    """Hit/miss counters of the API response cache, for monitoring"""
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response(api_cache_stats())
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Streams a whole table (see products.export): ``/api/export/products.csv``
+    or ``.ndjson``, or negotiated from the ``Accept`` header.
+    """
+
+    permission_classes = [IsAdminUser]
+    renderer_classes = EXPORT_RENDERERS
+
+    def retrieve(self, request, pk=None, format=None):
+        if pk not in EXPORTS:
+            raise NotFound()
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export_lines(pk, renderer.format),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        filename = f"{pk}-{timezone.localdate():%Y%m%d}.{renderer.format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SalesRollupViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Daily sales rollups, newest first. ``?start=``/``?end=`` (YYYY-MM-DD)
+    bound the range, ``top`` ranks the range's totals by revenue.
+    """
+
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    # Field the rollup is keyed on besides the date
+    rollup_key = None
+
+    def get_keyset_ordering(self):
+        return ("-date", "-id")
+
+    def get_filter_form(self):
+        form = SalesFilterForm(self.request.query_params)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        return form
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related(self.rollup_key)
+        return self.get_filter_form().filter_queryset(queryset)
+
+    @action(detail=False)
+    def top(self, request):
+        """Range totals per product/category, highest revenue first"""
+        key = self.rollup_key
+        rows = (
+            self.get_filter_form()
+            .filter_queryset(self.queryset)
+            .values(key, f"{key}__title")
+            .annotate(units=Sum("units"), revenue=Sum("revenue"), orders=Sum("orders"))
+            .order_by("-revenue", key)[:50]
+        )
+        return Response(
+            [
+                {
+                    key: row[key],
+                    "title": row[f"{key}__title"],
+                    "units": row["units"],
+                    "revenue": row["revenue"],
+                    "orders": row["orders"],
+                }
+                for row in rows
+            ]
+        )
+
+
+class ProductSalesViewSet(SalesRollupViewSet):
+    queryset = ProductSalesDaily.objects.all()
+    serializer_class = ProductSalesDailySerializer
+    rollup_key = "product"
+
+
+class CategorySalesViewSet(SalesRollupViewSet):
+    queryset = CategorySalesDaily.objects.all()
+    serializer_class = CategorySalesDailySerializer
+    rollup_key = "category"
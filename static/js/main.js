@@ -149,13 +149,20 @@
 	// Price Slider
 	var priceSlider = document.getElementById('price-slider');
 	if (priceSlider) {
+		// Bounds come from the store facets, start from the submitted filter
+		var sliderMin = parseInt(priceSlider.dataset.min) || 1,
+				sliderMax = Math.max(parseInt(priceSlider.dataset.max) || 999, sliderMin + 1);
 		noUiSlider.create(priceSlider, {
-			start: [1, 999],
+			start: [priceInputMin.value || sliderMin, priceInputMax.value || sliderMax],
 			connect: true,
 			step: 1,
 			range: {
-				'min': 1,
-				'max': 999
+				'min': sliderMin,
+				'max': sliderMax
+			},
+			format: {
+				to: function (value) { return Math.round(value); },
+				from: Number
 			}
 		});
 